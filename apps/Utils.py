@@ -1,35 +1,32 @@
-import os
-
+from django.db.models.functions import Lower
 
+from apps.authentication.deletion import request_deletion
 from apps.authentication.models import CustomUser as User
-from core import settings
 
 
-def username_exists(username):
-    user_query = User.objects.filter(username=username)
-    if user_query.exists():
-        return user_query.first()
+# Lookups compare Lower(column) so they hit the case-insensitive unique
+# indexes on CustomUser; each helper is a single query.
 
-    return False
+def username_exists(username):
+    return User.objects.alias(username_lower=Lower('username')).filter(
+        username_lower=username.lower()
+    ).first() or False
 
 
 def email_exists(email):
-    user_query = User.objects.filter(email=email)
-
-    if user_query.exists():
-        return user_query.first()
-
-    return False
+    if not email:
+        return False
+    return User.objects.alias(email_lower=Lower('email')).filter(
+        email_lower=email.lower()
+    ).exclude(email='').first() or False
 
 
 def delete_user(to_delete_user_username):
-    user = User.objects.filter(username=to_delete_user_username)
-    if user.count() == 0:
+    user = User.objects.filter(username=to_delete_user_username).only('pk', 'is_superuser').first()
+    if user is None:
         return False, 'User not found.'
-    if user.last().is_superuser:
+    if user.is_superuser:
         return False, 'Cannot delete superuser.'
-    try:
-        user.delete()
-    except Exception as e:
-        return False, str(e)
-    return True, f'{to_delete_user_username} deleted successfully.'
+    # Related rows are removed in batches by the maintenance runner (purge_requested_accounts)
+    request_deletion(user)
+    return True, f'{to_delete_user_username} scheduled for deletion.'
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
+from apps.utils.changelists import LargeTableAdmin, UsernameFilter
 from .models import CustomUser, TrackedEmail
 
 # Create a mutable copy of the default UserAdmin fieldsets
@@ -21,7 +22,7 @@ for i, (name, options) in enumerate(modified_fieldsets):
         break # Stop after modifying the correct fieldset
 
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdmin, UserAdmin):
     # Assign the modified fieldsets to the class attribute
     fieldsets = tuple(modified_fieldsets)
 
@@ -33,12 +34,15 @@ class CustomUserAdmin(UserAdmin):
     )
 
     list_display = ("username", "email", "first_name", "last_name", "is_staff")
-    search_fields = ("username", "first_name", "last_name", "email")
+    # Every column here has a trigram index (migrations 0017 and 0021), so a search never scans the table
+    search_fields = ("username", "email", "first_name", "last_name")
     ordering = ("username",)
 
 
 @admin.register(TrackedEmail)
-class TrackedEmailAdmin(admin.ModelAdmin):
+class TrackedEmailAdmin(LargeTableAdmin):
     list_display = ('user', 'email', 'nickname')
-    list_filter = ('user',)
+    list_select_related = ('user',)
+    list_filter = (UsernameFilter,)
+    autocomplete_fields = ('user',)
     search_fields = ('email', 'nickname', 'user__username')
@@ -6,6 +6,13 @@ class AuthConfig(AppConfig):
     name = 'apps.authentication'
 
     def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_save
+        from . import checks  # noqa: F401  (registers the deploy checks)
+        from .backends import forget_missing_user
+
+        post_save.connect(forget_missing_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='forget_missing_user')
+
         try:
             from django.contrib.sites.models import Site
             from django.conf import settings
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import hashlib
+
+from allauth.account.auth_backends import AuthenticationBackend
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+def _miss_key(identifier):
+    return 'auth-miss:' + hashlib.sha256(identifier.lower().encode('utf-8')).hexdigest()
+
+
+IDENTIFIER_FIELDS = {'username', 'email'}
+
+
+def forget_missing_user(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    post_save receiver: a new or renamed user must not stay cached as missing.
+    Saves limited to other columns (last_login on every login, profile edits)
+    can't have changed an identifier and are skipped.
+    """
+    if not created and update_fields is not None and not IDENTIFIER_FIELDS.intersection(update_fields):
+        return
+    cache.delete_many([_miss_key(identifier) for identifier in (instance.username, instance.email) if identifier])
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """
+    Authenticates a login form's `username` input with a single query.
+
+    Input without an '@' can only be a username; input with one is matched
+    against the email and the username in the same query (email wins, as with
+    allauth). Both comparisons use the case-insensitive unique indexes on
+    CustomUser. Identifiers that match nobody are remembered in the cache for
+    AUTH_NEGATIVE_CACHE_SECONDS, so repeated attempts skip the database.
+
+    It is the only backend that handles bare `username=` credentials (see
+    AllauthEmailBackend), so a failed login costs one query and one hash.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        # allauth's own forms send `email=`/`phone=` along; those are AllauthEmailBackend's
+        if username is None or password is None or kwargs.get('email') or kwargs.get('phone'):
+            return None
+
+        user = self.find_user(username)
+        if user is None:
+            # Same hashing cost as a real check, so timing doesn't reveal unknown users
+            get_user_model()().set_password(password)
+            return None
+
+        if user.check_password(password):
+            if self.user_can_authenticate(user):
+                return user
+            # Lets allauth's login view show its "account inactive" page, as its backend would
+            AuthenticationBackend._stash_user(user)
+        return None
+
+    def find_user(self, identifier):
+        key = _miss_key(identifier)
+        if cache.get(key):
+            return None
+
+        value = identifier.lower()
+        users = get_user_model()._default_manager.alias(username_lower=Lower('username'))
+        if '@' in identifier:
+            candidates = list(
+                users.alias(email_lower=Lower('email'))
+                .filter(Q(email_lower=value) & ~Q(email='') | Q(username_lower=value))[:2]
+            )
+            user = next((u for u in candidates if u.email and u.email.lower() == value), None) \
+                or next(iter(candidates), None)
+        else:
+            user = users.filter(username_lower=value).first()
+
+        if user is None:
+            cache.set(key, True, settings.AUTH_NEGATIVE_CACHE_SECONDS)
+        return user
+
+
+class AllauthEmailBackend(AuthenticationBackend):
+    """
+    allauth's backend, limited to the credentials allauth's forms send with an
+    `email=` or `phone=` (verified secondary addresses, phone logins).
+
+    Bare `username=` logins are left to UsernameOrEmailBackend; running both
+    would hash the password twice on every failed attempt.
+    """
+
+    def authenticate(self, request, **credentials):
+        if not (credentials.get('email') or credentials.get('phone')):
+            return None
+        return super().authenticate(request, **credentials)
@@ -0,0 +1,161 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import csv
+import io
+import json
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+
+from .forms import TrackedEmailForm
+from .models import TrackedEmail
+from .tokens import issue_verification_token
+
+
+def verification_email(verification_link, recipient):
+    return EmailMessage(
+        'Verify Your Email for Kryptisk Tracking',
+        f"Please click the link to verify your email address for tracking: {verification_link}",
+        settings.EMAIL_SENDER,
+        [recipient],
+    )
+
+
+def parse_rows(content, content_type=''):
+    """
+    Turn a JSON or CSV payload into a list of {'email', 'nickname'} dicts.
+
+    JSON may be a list of addresses, a list of objects, or {"emails": [...]}.
+    CSV may have an `email[,nickname]` header or just the columns in that order.
+    Raises ValueError for payloads that can't be parsed at all.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+
+    if 'json' in content_type or content.lstrip().startswith(('[', '{')):
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e}')
+        if isinstance(data, dict):
+            data = data.get('emails', [])
+        if not isinstance(data, list):
+            raise ValueError('Expected a list of emails.')
+        rows = []
+        for item in data:
+            if isinstance(item, str):
+                rows.append({'email': item, 'nickname': ''})
+            elif isinstance(item, dict):
+                rows.append({'email': str(item.get('email', '')), 'nickname': str(item.get('nickname', '') or '')})
+            else:
+                raise ValueError('Expected a list of emails.')
+        return rows
+
+    rows = [row for row in csv.reader(io.StringIO(content)) if any(cell.strip() for cell in row)]
+    if rows and rows[0] and rows[0][0].strip().lower() == 'email':
+        rows = rows[1:]
+    return [{'email': row[0].strip(), 'nickname': row[1].strip() if len(row) > 1 else ''} for row in rows]
+
+
+def insert_tracked_emails(tracked_emails):
+    """
+    Insert `tracked_emails` in one statement and return the ones that went in.
+    If another request added one of the addresses in the meantime, fall back
+    to inserting row by row and leave out the ones that lost the race.
+    """
+    try:
+        with transaction.atomic():
+            TrackedEmail.objects.bulk_create(tracked_emails)
+        return tracked_emails
+    except IntegrityError:
+        pass
+
+    inserted = []
+    for tracked_email in tracked_emails:
+        # Batches that went in before the failure were rolled back with it
+        tracked_email.pk = None
+        try:
+            with transaction.atomic():
+                tracked_email.save(force_insert=True)
+        except IntegrityError:
+            continue
+        inserted.append(tracked_email)
+    return inserted
+
+
+def bulk_add_tracked_emails(user, rows, build_link):
+    """
+    Validate and insert `rows` for `user` in one bulk INSERT, then send all
+    verification mails over a single SMTP connection.
+
+    `build_link(token)` returns the absolute verification URL for a token.
+    Returns a report dict with one result per row plus totals and throughput.
+    """
+    start = time.perf_counter()
+
+    if len(rows) > settings.TRACKED_EMAIL_BULK_MAX_ROWS:
+        raise ValueError(f'At most {settings.TRACKED_EMAIL_BULK_MAX_ROWS} rows can be imported at once.')
+
+    existing = set(TrackedEmail.objects.filter(user=user).values_list('email', flat=True))
+    remaining = settings.TRACKED_EMAIL_LIMIT - len(existing - {user.email})
+
+    results = []
+    pending = []  # (tracked_email, result, verification link)
+    for index, row in enumerate(rows, start=1):
+        result = {'row': index, 'email': row.get('email', '')}
+        results.append(result)
+
+        form = TrackedEmailForm(data=row)
+        if not form.is_valid():
+            result['status'] = 'invalid'
+            result['errors'] = {field: [str(e) for e in errors] for field, errors in form.errors.items()}
+            continue
+
+        email = form.cleaned_data['email']
+        result['email'] = email
+        if email == user.email:
+            result['status'] = 'primary'
+        elif email in existing:
+            result['status'] = 'duplicate'
+        elif remaining <= 0:
+            result['status'] = 'limit_reached'
+        else:
+            tracked_email = form.save(commit=False)
+            tracked_email.user = user
+            tracked_email.is_verified = False
+            token = issue_verification_token(tracked_email)
+            pending.append((tracked_email, result, build_link(token)))
+            existing.add(email)
+            remaining -= 1
+
+    inserted = insert_tracked_emails([tracked_email for tracked_email, _, _ in pending])
+    messages = []
+    for tracked_email, result, link in pending:
+        if tracked_email.pk is not None:
+            result['status'] = 'created'
+            messages.append(verification_email(link, tracked_email.email))
+        else:
+            # Added by a concurrent request after we looked
+            result['status'] = 'duplicate'
+
+    mail_error = None
+    if messages:
+        try:
+            get_connection(fail_silently=False).send_messages(messages)
+        except Exception as e:
+            mail_error = str(e)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'results': results,
+        'created': len(inserted),
+        'rows': len(rows),
+        'mail_error': mail_error,
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'rows_per_second': round(len(rows) / elapsed, 1) if elapsed else None,
+    }
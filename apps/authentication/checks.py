@@ -0,0 +1,20 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_login_throttle_cache(app_configs, **kwargs):
+    """The login throttle (throttle.py) only holds across workers with a shared cache."""
+    if settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    return [Warning(
+        'The default cache is per process, so every worker keeps its own failed-login '
+        'counters and the LOGIN_THROTTLE_* limits are multiplied by the number of workers.',
+        hint="Set CACHE_BACKEND to 'file' (one host) or 'redis' (several hosts).",
+        id='authentication.W001',
+    )]
@@ -0,0 +1,69 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+from apps.utils.maintenance import delete_in_batches
+from apps.utils.storage import delete_directory, delete_file
+
+logger = logging.getLogger(__name__)
+
+
+def request_deletion(user):
+    """
+    Deactivate `user` right away and leave the actual deletion to
+    purge_requested_accounts. One UPDATE, however much data the user has.
+
+    The unusable password also changes the session auth hash, which logs the
+    user out of every session at once, whatever the session engine. The dead
+    session rows are left to the clear_expired_sessions job.
+    """
+    now = timezone.now()
+    user.set_unusable_password()
+    get_user_model().objects.filter(pk=user.pk).update(is_active=False, deletion_requested_at=now,
+                                                       password=user.password)
+    user.is_active = False
+    user.deletion_requested_at = now
+
+
+def purge_user(user, batch_size):
+    """
+    Delete `user` and everything that cascades from it, `batch_size` rows per
+    statement. Related models without signals or further cascades (notifications,
+    tracked emails, ...) go through Django's fast path, a plain DELETE ... WHERE
+    pk IN (...); others are collected one batch at a time. What's left for the
+    final user.delete() is the row itself, its m2m links and SET_NULL relations.
+    """
+    removed = 0
+    for relation in user._meta.related_objects:
+        if relation.many_to_many or relation.on_delete is not models.CASCADE:
+            continue
+        queryset = relation.related_model._base_manager.filter(**{relation.field.name: user})
+        removed += delete_in_batches(queryset, batch_size)
+
+    delete_file(user.avatar)
+    delete_directory(f'qrcodes/{user.pk}')
+    user.delete()
+    return removed + 1
+
+
+def purge_requested_accounts(batch_size):
+    """
+    Maintenance job: purge every account deactivated through request_deletion.
+    A user whose purge fails (a storage error, say) is logged and retried on the
+    next run; it doesn't hold up the users queued after it.
+    """
+    users = get_user_model().objects.filter(deletion_requested_at__isnull=False).order_by('deletion_requested_at')
+    removed = 0
+    for user in users:
+        try:
+            removed += purge_user(user, batch_size)
+        except Exception:
+            logger.exception('Purging user %s failed; retrying on the next run', user.pk)
+    return removed
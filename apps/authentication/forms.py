@@ -109,6 +109,25 @@ class ProfileForm(forms.ModelForm):
         fields = ('first_name', 'last_name', 'bio', 'social_twitter', 'social_facebook', 'social_instagram', 'avatar',)
 
 
+class ProfileAPIForm(forms.ModelForm):
+    """
+    Validates a PATCH to the profile API. The view builds a subclass limited to
+    the fields present in the request, so absent fields are left untouched.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            field.required = name == 'username'
+
+    class Meta:
+        model = CustomUser
+        fields = (
+            'username', 'first_name', 'last_name', 'bio', 'website',
+            'social_twitter', 'social_facebook', 'social_instagram',
+            'vcard_include_name', 'vcard_include_email', 'vcard_include_website', 'vcard_include_bio',
+        )
+
+
 class TrackedEmailForm(forms.ModelForm):
     class Meta:
         model = TrackedEmail
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+# Each entry is a whole AUTHENTICATION_BACKENDS chain: a failed login pays for
+# every backend in it, so timing one backend alone understates the cost.
+CHAINS = {
+    'allauth': ('allauth.account.auth_backends.AuthenticationBackend',),
+    'configured': tuple(settings.AUTHENTICATION_BACKENDS),
+}
+
+
+class CountingHasher(MD5PasswordHasher):
+    """A fast hasher that counts hashes, so the lookup cost stays visible next to them."""
+    hashes = 0
+
+    def encode(self, password, salt):
+        CountingHasher.hashes += 1
+        return super().encode(password, salt)
+
+
+class Command(BaseCommand):
+    help = ('Compare queries and time per login through django.contrib.auth.authenticate() with allauth\'s '
+            'backend alone and with the configured AUTHENTICATION_BACKENDS (runs on a throwaway test database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Login attempts per chain and input.')
+
+    def handle(self, *args, **options):
+        logins = options['logins']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        with override_settings(PASSWORD_HASHERS=[f'{__name__}.CountingHasher']):
+            try:
+                get_user_model().objects.create_user('bench', 'bench@example.com', 'bench-password')
+                inputs = {
+                    'username': ('Bench', 'bench-password'),
+                    'email': ('Bench@Example.com', 'bench-password'),
+                    'wrong pw': ('bench', 'wrong-password'),
+                    'unknown': ('nobody@example.com', 'bench-password'),
+                }
+
+                self.stdout.write(f"{'chain':<11} {'input':<10} {'queries/login':>14} {'hashes/login':>13} {'ms/login':>10}")
+                for name, backends in CHAINS.items():
+                    with override_settings(AUTHENTICATION_BACKENDS=backends):
+                        for label, (identifier, password) in inputs.items():
+                            cache.clear()
+                            CountingHasher.hashes = 0
+                            with CaptureQueriesContext(connection) as queries:
+                                start = time.perf_counter()
+                                for _ in range(logins):
+                                    authenticate(None, username=identifier, password=password)
+                                elapsed = time.perf_counter() - start
+                            self.stdout.write(
+                                f'{name:<11} {label:<10} {len(queries) / logins:>14.2f} '
+                                f'{CountingHasher.hashes / logins:>13.2f} {elapsed * 1000 / logins:>10.3f}'
+                            )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
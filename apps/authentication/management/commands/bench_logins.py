@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from apps.authentication import throttle
+
+
+class Command(BaseCommand):
+    help = 'Measure password checks per second on one core for each configured hasher, and the throttle rejection path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3, help='Seconds to measure each hasher for.')
+
+    def handle(self, *args, **options):
+        password = 'correct horse battery staple'
+
+        self.stdout.write(f"{'hasher':<10} {'logins/s/core':>14} {'ms/login':>10}")
+        for name, path in settings.PASSWORD_HASHER_CLASSES.items():
+            try:
+                hasher = import_string(path)()
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as e:
+                # e.g. argon2-cffi not installed
+                self.stdout.write(f'{name:<10} skipped: {e}')
+                continue
+            rate = self.measure(lambda: hasher.verify(password, encoded), options['seconds'])
+            marker = ' (active)' if name == settings.PASSWORD_HASHER else ''
+            self.stdout.write(f'{name:<10} {rate:>14.1f} {1000 / rate:>10.2f}{marker}')
+
+        for _ in range(settings.LOGIN_THROTTLE_USERNAME_LIMIT):
+            throttle.register_failure('203.0.113.1', 'bench-victim')
+        rate = self.measure(lambda: throttle.is_blocked('203.0.113.1', 'bench-victim'), options['seconds'])
+        self.stdout.write(f"{'throttled':<10} {rate:>14.1f} {1000 / rate:>10.2f}")
+        throttle.reset('bench-victim')
+
+    def measure(self, func, seconds):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            func()
+            count += 1
+        return count / (time.perf_counter() - start)
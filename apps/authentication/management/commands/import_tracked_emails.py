@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from apps.authentication.bulk import bulk_add_tracked_emails, parse_rows
+
+
+class Command(BaseCommand):
+    help = 'Import tracked emails for a user from a CSV or JSON file and send the verification mails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the emails are tracked for.')
+        parser.add_argument('path', help='CSV (email[,nickname]) or JSON file.')
+        parser.add_argument('--base-url', default=None,
+                            help='Scheme and host for verification links. Defaults to the current Site.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User '{options['username']}' not found.")
+
+        base_url = options['base_url'] or f'{settings.ACCOUNT_DEFAULT_HTTP_PROTOCOL}://{Site.objects.get_current().domain}'
+        base_url = base_url.rstrip('/')
+
+        try:
+            with open(options['path'], 'rb') as f:
+                content = f.read()
+            content_type = 'application/json' if options['path'].endswith('.json') else 'text/csv'
+            rows = parse_rows(content, content_type)
+            report = bulk_add_tracked_emails(
+                user, rows, lambda token: base_url + reverse('verify_tracked_email', kwargs={'token': token}),
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for result in report['results']:
+            line = f"{result['row']:>5}  {result['email']:<40} {result['status']}"
+            if result['status'] == 'created':
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(self.style.WARNING(line))
+
+        if report['mail_error']:
+            self.stderr.write(self.style.ERROR(f"Sending verification mails failed: {report['mail_error']}"))
+        self.stdout.write(
+            f"{report['created']} of {report['rows']} row(s) imported in {report['elapsed_ms']} ms "
+            f"({report['rows_per_second']} rows/s)"
+        )
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.authentication.trials import send_trial_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send a notification and an email to every unsubscribed user whose trial ends soon, in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--within-hours', type=float, default=24,
+                            help='Remind users whose trial ends within this many hours from now.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Users fetched, notified and marked per batch.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the users that would be reminded.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        report = send_trial_reminders(
+            now, now + timedelta(hours=options['within_hours']),
+            chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+        )
+
+        verb = 'would be reminded' if options['dry_run'] else 'reminded'
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['users']} user(s) {verb} in {report['seconds']:.2f}s ({report['rows_per_second']} rows/s): "
+            f"{report['notifications']} notification(s), {report['emails']} email(s) sent"
+        ))
+        if report['mail_errors']:
+            self.stderr.write(self.style.ERROR(
+                f"{report['mail_errors']} email(s) could not be sent; those users will be retried on the next run."
+            ))
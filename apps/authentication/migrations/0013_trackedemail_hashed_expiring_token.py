@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:34
+
+import hashlib
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def hash_existing_tokens(apps, schema_editor):
+    # Links already sent carry the raw token; storing its hash keeps them valid.
+    TrackedEmail = apps.get_model('authentication', 'TrackedEmail')
+    expires_at = timezone.now() + timedelta(hours=48)
+    for tracked_email in TrackedEmail.objects.exclude(verification_token=None).exclude(verification_token=''):
+        tracked_email.verification_token = hashlib.sha256(tracked_email.verification_token.encode('utf-8')).hexdigest()
+        tracked_email.token_expires_at = expires_at
+        tracked_email.save(update_fields=['verification_token', 'token_expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_customuser_vcard_include_bio_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedemail',
+            name='token_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(hash_existing_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='trackedemail',
+            name='verification_token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Trigram indexes for the admin's icontains search, which PostgreSQL runs as
+# UPPER("column"::text) LIKE UPPER('%term%'). The index expressions match that
+# exactly so the planner can use them. Other databases are left alone.
+TRIGRAM_INDEXES = [
+    ('customuser_username_trgm', 'authentication_customuser', 'username'),
+    ('customuser_email_trgm', 'authentication_customuser', 'email'),
+    ('trackedemail_email_trgm', 'authentication_trackedemail', 'email'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0016_customuser_deletion_requested_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
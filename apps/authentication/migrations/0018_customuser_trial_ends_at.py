@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:55
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+# The trial length every existing account was given by the views until now
+LEGACY_TRIAL_DAYS = 3
+
+
+def backfill_trial_ends_at(apps, schema_editor):
+    CustomUser = apps.get_model('authentication', 'CustomUser')
+    CustomUser.objects.filter(trial_ends_at__isnull=True).update(
+        trial_ends_at=F('date_joined') + timedelta(days=LEGACY_TRIAL_DAYS)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0017_admin_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='trial_ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_trial_ends_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('subscribed', False)), fields=['trial_ends_at'], name='customuser_trial_ends_idx'),
+        ),
+    ]
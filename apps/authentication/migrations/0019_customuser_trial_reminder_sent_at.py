@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0018_customuser_trial_ends_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='trial_reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
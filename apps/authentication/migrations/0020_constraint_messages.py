@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0019_customuser_trial_reminder_sent_at'),
+    ]
+
+    operations = [
+        migrations.AlterConstraint(
+            model_name='customuser',
+            name='customuser_username_ci_unique',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='customuser_username_ci_unique', violation_error_message='A user with that username already exists.'),
+        ),
+        migrations.AlterConstraint(
+            model_name='customuser',
+            name='customuser_email_ci_unique',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='customuser_email_ci_unique', violation_error_message='A user with that email already exists.'),
+        ),
+    ]
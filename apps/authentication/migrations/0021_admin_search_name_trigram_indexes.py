@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# More trigram indexes for admin search (see 0017): user names and tracked
+# email nicknames. PostgreSQL only.
+TRIGRAM_INDEXES = [
+    ('customuser_first_name_trgm', 'authentication_customuser', 'first_name'),
+    ('customuser_last_name_trgm', 'authentication_customuser', 'last_name'),
+    ('trackedemail_nickname_trgm', 'authentication_trackedemail', 'nickname'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0020_constraint_messages'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
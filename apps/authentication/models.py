@@ -2,8 +2,11 @@
 """
 Copyright (c) 2019 - present AppSeed.us
 """
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.conf import settings
 
 
@@ -15,6 +18,9 @@ class CustomUser(AbstractUser):
     website = models.URLField(blank=True, null=True, default=None)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     subscribed = models.BooleanField(default=False) # New field for subscription status
+    # date_joined + TRIAL_DURATION_DAYS, stored so expiring trials can be found by index (see trials.py)
+    trial_ends_at = models.DateTimeField(blank=True, null=True)
+    trial_reminder_sent_at = models.DateTimeField(blank=True, null=True)
     
     # vCard toggle preferences
     vcard_include_name = models.BooleanField(default=True)
@@ -22,13 +28,38 @@ class CustomUser(AbstractUser):
     vcard_include_website = models.BooleanField(default=True)
     vcard_include_bio = models.BooleanField(default=True)
 
+    # Set by delete_account; the rows are purged later by the maintenance runner (see deletion.py)
+    deletion_requested_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta(AbstractUser.Meta):
+        # Case-insensitive uniqueness; the indexes also serve the Lower() lookups
+        # in backends.UsernameOrEmailBackend and apps.Utils. Blank emails (some
+        # social signups) are left out, so lookups must exclude email=''.
+        constraints = [
+            models.UniqueConstraint(Lower('username'), name='customuser_username_ci_unique',
+                                    violation_error_message='A user with that username already exists.'),
+            models.UniqueConstraint(Lower('email'), condition=~models.Q(email=''), name='customuser_email_ci_unique',
+                                    violation_error_message='A user with that email already exists.'),
+        ]
+        indexes = [
+            # Only unsubscribed users have a trial to run out
+            models.Index(fields=['trial_ends_at'], condition=models.Q(subscribed=False), name='customuser_trial_ends_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.trial_ends_at is None:
+            self.trial_ends_at = self.date_joined + timedelta(days=settings.TRIAL_DURATION_DAYS)
+        super().save(*args, **kwargs)
+
 
 class TrackedEmail(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tracked_emails')
     email = models.EmailField()
     nickname = models.CharField(max_length=100, blank=True)
     is_verified = models.BooleanField(default=False)
-    verification_token = models.CharField(max_length=100, blank=True, null=True, unique=True)
+    # SHA-256 of the token sent in the verification link (see tokens.py)
+    verification_token = models.CharField(max_length=64, blank=True, null=True, unique=True)
+    token_expires_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         unique_together = ('user', 'email')
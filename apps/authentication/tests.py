@@ -3,6 +3,819 @@
 Copyright (c) 2019 - present AppSeed.us
 """
 
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from allauth.account.auth_backends import AuthenticationBackend
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, identify_hasher, make_password
+from django.core import mail
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps import Utils
+from apps.authentication import throttle, tokens
+from apps.authentication.backends import UsernameOrEmailBackend, _miss_key
+from apps.authentication.checks import check_login_throttle_cache
+from apps.authentication.hashers import (
+    TunedArgon2PasswordHasher, TunedPBKDF2PasswordHasher, TunedScryptPasswordHasher,
+)
+from apps.authentication.bulk import parse_rows
+from apps.authentication.models import CustomUser, TrackedEmail
+from apps.authentication.tokens import hash_token, issue_verification_token, tracked_email_for_token
+from apps.authentication.trials import trial_status, trials_expiring_on
+from apps.notifications.models import Notification
+
+# Every authenticated request costs two queries before the view runs:
+# the session lookup and the user lookup.
+AUTH_QUERIES = 2
+
+UPDATE_STATEMENT = re.compile(r'UPDATE "(\w+)" SET (.*) WHERE ', re.DOTALL)
+
+
+class ColumnWriteAssertions:
+
+    @contextmanager
+    def assertColumnsWritten(self, model, *columns):
+        """Fail unless the UPDATEs run inside the block wrote exactly `columns` of `model`'s table."""
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        written = set()
+        for query in queries.captured_queries:
+            match = UPDATE_STATEMENT.match(query['sql'])
+            if match and match.group(1) == model._meta.db_table:
+                written.update(re.findall(r'"(\w+)" = ', match.group(2)))
+        self.assertEqual(written, set(columns))
+
+
+class EmailRegistrationQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('alice', 'alice@example.com', 'alice-password')
+        self.tracked = TrackedEmail.objects.create(user=self.user, email='work@example.com')
+        self.client.force_login(self.user)
+        self.url = reverse('email_registration')
+
+    def post(self, queries, **data):
+        with self.assertNumQueries(AUTH_QUERIES + queries):
+            return self.client.post(self.url, data)
+
+    def test_get_loads_tracked_emails_once(self):
+        with self.assertNumQueries(AUTH_QUERIES + 1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['is_primary_email_tracked'])
+        self.assertEqual(response.context['non_primary_tracked_emails_count'], 1)
+
+    def test_add_email(self):
+        # snapshot, insert, notification
+        response = self.post(3, action='add_email', email='home@example.com')
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertTrue(TrackedEmail.objects.filter(user=self.user, email='home@example.com').exists())
+
+    def test_add_email_invalid_form_rerenders(self):
+        response = self.post(1, action='add_email', email='not-an-email')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+
+    def test_add_duplicate_email_skips_insert(self):
+        self.post(2, action='add_email', email='work@example.com')
+        self.assertEqual(TrackedEmail.objects.filter(user=self.user).count(), 1)
+
+    def test_toggle_primary_email_tracking(self):
+        self.post(3, action='toggle_primary_email_tracking', track_primary_email_checkbox='on')
+        self.assertTrue(TrackedEmail.objects.filter(user=self.user, email=self.user.email).exists())
+
+        self.post(3, action='toggle_primary_email_tracking')
+        self.assertFalse(TrackedEmail.objects.filter(user=self.user, email=self.user.email).exists())
+
+    def test_edit_email(self):
+        self.post(3, action='edit_email', email_id=self.tracked.id, email='new@example.com', nickname='Work')
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.email, 'new@example.com')
+        self.assertFalse(self.tracked.is_verified)
+
+    def test_remove_email(self):
+        self.post(3, action='remove_email', email_id=self.tracked.id)
+        self.assertFalse(TrackedEmail.objects.filter(pk=self.tracked.pk).exists())
+
+    def test_resend_verification(self):
+        self.post(3, action='resend_verification', email_id=self.tracked.id)
+        self.tracked.refresh_from_db()
+        self.assertIsNotNone(self.tracked.verification_token)
+
+    def test_resend_verification_failure_is_logged(self):
+        with mock.patch('apps.authentication.views._send_verification_email', side_effect=OSError('smtp down')), \
+                self.assertLogs('apps.authentication.views', 'ERROR'):
+            self.post(3, action='resend_verification', email_id=self.tracked.id)
+        self.assertTrue(Notification.objects.filter(user=self.user, message__startswith='An error occurred').exists())
+
+    def test_unknown_email_id(self):
+        self.post(2, action='remove_email', email_id=0)
+
+
+class UtilsLookupTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('Alice', 'Alice@Example.com', 'alice-password')
+
+    def test_username_exists_is_one_case_insensitive_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Utils.username_exists('alice'), self.user)
+        with self.assertNumQueries(1):
+            self.assertIs(Utils.username_exists('bob'), False)
+
+    def test_email_exists_is_one_case_insensitive_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Utils.email_exists('alice@example.COM'), self.user)
+        with self.assertNumQueries(1):
+            self.assertIs(Utils.email_exists('bob@example.com'), False)
+
+    def test_blank_email_never_matches(self):
+        CustomUser.objects.create_user('social', '', 'social-password')
+        with self.assertNumQueries(0):
+            self.assertIs(Utils.email_exists(''), False)
+
+    def test_delete_user_lookup_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Utils.delete_user('nobody'), (False, 'User not found.'))
+        CustomUser.objects.create_superuser('root', 'root@example.com', 'root-password')
+        with self.assertNumQueries(1):
+            self.assertEqual(Utils.delete_user('root'), (False, 'Cannot delete superuser.'))
+
+    def test_delete_user_deactivates_in_two_queries(self):
+        TrackedEmail.objects.create(user=self.user, email='work@example.com')
+        with self.assertNumQueries(2):
+            result, _ = Utils.delete_user('Alice')
+        self.assertTrue(result)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deletion_requested_at)
+
+    def test_username_and_email_are_unique_ignoring_case(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CustomUser.objects.create_user('ALICE', 'other@example.com')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CustomUser.objects.create_user('alice2', 'alice@example.com')
+        # Several accounts without an email are fine
+        CustomUser.objects.create_user('social1', '')
+        CustomUser.objects.create_user('social2', '')
+
+
+class VerificationTokenTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('ivan', 'ivan@example.com', 'ivan-password')
+        self.tracked = TrackedEmail.objects.create(user=self.user, email='work@example.com')
+
+    def issue(self):
+        token = issue_verification_token(self.tracked)
+        self.tracked.save(update_fields=['verification_token', 'token_expires_at'])
+        return token
+
+    def verify(self, token):
+        return self.client.get(reverse('verify_tracked_email', args=[token]))
+
+    def test_hashed_token_is_stored_hashed(self):
+        token = self.issue()
+        self.assertEqual(self.tracked.verification_token, hash_token(token))
+        self.assertNotEqual(self.tracked.verification_token, token)
+        self.assertEqual(tracked_email_for_token(token), self.tracked)
+        self.assertIsNone(tracked_email_for_token(hash_token(token)))
+
+    def test_hashed_token_expires(self):
+        token = self.issue()
+        with mock.patch('django.utils.timezone.now',
+                        return_value=self.tracked.token_expires_at + timedelta(seconds=1)):
+            self.assertIsNone(tracked_email_for_token(token))
+            self.assertEqual(self.verify(token).status_code, 404)
+
+    def test_hashed_token_is_single_use(self):
+        token = self.issue()
+        self.assertEqual(self.verify(token).status_code, 302)
+        self.tracked.refresh_from_db()
+        self.assertTrue(self.tracked.is_verified)
+        self.assertIsNone(self.tracked.verification_token)
+        self.assertEqual(self.verify(token).status_code, 404)
+
+    @override_settings(TRACKED_EMAIL_TOKEN_MODE='signed', TRACKED_EMAIL_TOKEN_TTL_HOURS=1)
+    def test_signed_token_expires_and_is_single_use(self):
+        token = self.issue()
+        self.assertIsNone(self.tracked.verification_token)
+        self.assertIsNone(tracked_email_for_token(token + 'x'))
+        with mock.patch('time.time', return_value=timezone.now().timestamp() + 3601):
+            self.assertIsNone(tracked_email_for_token(token))
+
+        self.assertEqual(self.verify(token).status_code, 302)
+        self.assertTrue(TrackedEmail.objects.get(pk=self.tracked.pk).is_verified)
+        self.assertEqual(self.verify(token).status_code, 404)
+
+
+class HashTokensMigrationTests(TransactionTestCase):
+    migrate_from = ('authentication', '0012_customuser_vcard_include_bio_and_more')
+    migrate_to = ('authentication', '0013_trackedemail_hashed_expiring_token')
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_tokens_are_hashed(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migrate_from])
+        old_apps = executor.loader.project_state([self.migrate_from]).apps
+        user = old_apps.get_model('authentication', 'CustomUser').objects.create(username='olga', email='olga@example.com')
+        OldTrackedEmail = old_apps.get_model('authentication', 'TrackedEmail')
+        OldTrackedEmail.objects.create(user=user, email='sent@example.com', verification_token='raw-token')
+        OldTrackedEmail.objects.create(user=user, email='none@example.com', verification_token=None)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migrate_to])
+        new_apps = executor.loader.project_state([self.migrate_to]).apps
+        TrackedEmail = new_apps.get_model('authentication', 'TrackedEmail')
+        sent = TrackedEmail.objects.get(email='sent@example.com')
+        self.assertEqual(sent.verification_token, hash_token('raw-token'))
+        self.assertGreater(sent.token_expires_at, timezone.now())
+        self.assertIsNone(TrackedEmail.objects.get(email='none@example.com').token_expires_at)
+
+
+@override_settings(TRACKED_EMAIL_LIMIT=2, TRACKED_EMAIL_BULK_MAX_ROWS=6)
+class BulkTrackedEmailTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('liam', 'liam@example.com', 'liam-password')
+        self.client.force_login(self.user)
+        self.url = reverse('bulk_tracked_emails')
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def statuses(self, response):
+        return [(result['email'], result['status']) for result in response.json()['results']]
+
+    def test_parse_rows(self):
+        self.assertEqual(parse_rows('email,nickname\na@example.com,A\n\nb@example.com\n'),
+                         [{'email': 'a@example.com', 'nickname': 'A'}, {'email': 'b@example.com', 'nickname': ''}])
+        self.assertEqual(parse_rows('{"emails": [{"email": "a@example.com", "nickname": null}]}'),
+                         [{'email': 'a@example.com', 'nickname': ''}])
+        for payload in ('[1, null]', '["a@example.com", 2]', '{"emails": "a@example.com"}', '[oops'):
+            with self.assertRaises(ValueError):
+                parse_rows(payload)
+
+    def test_malformed_payloads_are_rejected(self):
+        self.assertEqual(self.post('[1, null]').json()['message'], 'Expected a list of emails.')
+        self.assertEqual(self.post('[oops').status_code, 400)
+        self.assertEqual(self.post(json.dumps([f'{n}@example.com' for n in range(7)])).status_code, 400)
+        self.assertFalse(TrackedEmail.objects.exists())
+
+    def test_limit_and_duplicates(self):
+        TrackedEmail.objects.create(user=self.user, email='old@example.com')
+        response = self.post('email\nliam@example.com\nold@example.com\nnew@example.com\n'
+                             'new@example.com\nmore@example.com\nnot-an-email\n', content_type='text/csv')
+        self.assertEqual(self.statuses(response), [
+            ('liam@example.com', 'primary'),
+            ('old@example.com', 'duplicate'),
+            ('new@example.com', 'created'),
+            ('new@example.com', 'duplicate'),
+            ('more@example.com', 'limit_reached'),
+            ('not-an-email', 'invalid'),
+        ])
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([message.to for message in mail.outbox], [['new@example.com']])
+
+    @override_settings(QUERY_BUDGET_STRICT=False)  # the row-by-row fallback is over budget by design
+    def test_rows_added_concurrently_are_not_reported_or_mailed(self):
+        def add_concurrently(tracked_email):
+            if tracked_email.email == 'raced@example.com':
+                TrackedEmail.objects.create(user=self.user, email='raced@example.com')
+            return issue(tracked_email)
+
+        issue = tokens.issue_verification_token
+        with mock.patch('apps.authentication.bulk.issue_verification_token', side_effect=add_concurrently):
+            response = self.post(json.dumps(['raced@example.com', 'calm@example.com']))
+        self.assertEqual(self.statuses(response), [('raced@example.com', 'duplicate'),
+                                                   ('calm@example.com', 'created')])
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([message.to for message in mail.outbox], [['calm@example.com']])
+        self.assertEqual(TrackedEmail.objects.filter(user=self.user).count(), 2)
+
+
+@override_settings(LOGIN_THROTTLE_USERNAME_LIMIT=2, LOGIN_THROTTLE_IP_LIMIT=3)
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = CustomUser.objects.create_user('mia', 'mia@example.com', 'mia-password')
+        self.url = reverse('login')
+
+    def login(self, username='mia', password='wrong', ip='10.0.0.1'):
+        return self.client.post(self.url, {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_username_lockout_skips_authenticate(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 200)
+        with mock.patch('apps.authentication.views.authenticate') as authenticate:
+            response = self.login(password='mia-password', ip='10.0.0.3')
+        authenticate.assert_not_called()
+        self.assertContains(response, 'Too many login attempts', status_code=429)
+
+    def test_ip_lockout(self):
+        for username in ('a', 'b', 'c'):
+            self.login(username=username)
+        self.assertEqual(self.login(password='mia-password').status_code, 429)
+        self.assertEqual(self.login(password='mia-password', ip='10.0.0.2').status_code, 302)
+
+    @override_settings(LOGIN_THROTTLE_TRUSTED_PROXIES=1)
+    def test_ip_behind_a_proxy_ignores_spoofed_entries(self):
+        # nginx appends the address it saw to whatever the client sent
+        for n in range(3):
+            self.client.post(self.url, {'username': f'user{n}', 'password': 'wrong'}, REMOTE_ADDR='127.0.0.1',
+                             HTTP_X_FORWARDED_FOR=f'198.51.100.{n}, 203.0.113.9')
+        self.assertTrue(throttle.is_blocked('203.0.113.9', 'mia'))
+        self.assertFalse(throttle.is_blocked('127.0.0.1', 'mia'))
+        self.assertEqual(self.login(password='mia-password', ip='127.0.0.1').status_code, 302)
+
+    def test_success_resets_the_username_counter(self):
+        self.login()
+        self.assertRedirects(self.login(password='mia-password'), '/', fetch_redirect_response=False)
+        self.client.logout()
+        self.login(ip='10.0.0.2')
+        self.assertFalse(throttle.is_blocked('10.0.0.3', 'mia'))
+
+    def test_deploy_check_warns_about_a_per_process_cache(self):
+        self.assertEqual([warning.id for warning in check_login_throttle_cache(None)], ['authentication.W001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': tempfile.gettempdir()}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_login_throttle_cache(None), [])
+
+
+class PasswordHasherTests(TestCase):
+    salt = 'a' * 22
+
+    def test_new_hashes_use_the_configured_hasher(self):
+        self.assertEqual(settings.PASSWORD_HASHERS[0], settings.PASSWORD_HASHER_CLASSES[settings.PASSWORD_HASHER])
+        self.assertEqual(type(identify_hasher(make_password('pw'))), type(get_hasher()))
+
+    def test_tuned_hashers_store_the_configured_cost(self):
+        hasher = TunedPBKDF2PasswordHasher()
+        self.assertEqual(hasher.decode(hasher.encode('pw', self.salt))['iterations'],
+                         settings.PASSWORD_PBKDF2_ITERATIONS)
+        hasher = TunedScryptPasswordHasher()
+        self.assertEqual(hasher.decode(hasher.encode('pw', self.salt))['work_factor'],
+                         settings.PASSWORD_SCRYPT_WORK_FACTOR)
+        hasher = TunedArgon2PasswordHasher()
+        decoded = hasher.decode(hasher.encode('pw', self.salt))
+        self.assertEqual((decoded['time_cost'], decoded['memory_cost'], decoded['parallelism']),
+                         (settings.PASSWORD_ARGON2_TIME_COST, settings.PASSWORD_ARGON2_MEMORY_COST,
+                          settings.PASSWORD_ARGON2_PARALLELISM))
+
+    def test_weaker_hash_is_upgraded_on_login(self):
+        cache.clear()
+        user = CustomUser.objects.create_user('nora', 'nora@example.com')
+        user.password = PBKDF2PasswordHasher().encode('nora-password', self.salt, iterations=1000)
+        user.save(update_fields=['password'])
+
+        self.client.post(reverse('login'), {'username': 'nora', 'password': 'nora-password'})
+        user.refresh_from_db()
+        self.assertEqual(type(identify_hasher(user.password)), type(get_hasher()))
+        self.assertFalse(get_hasher().must_update(user.password))
+
+
+class UsernameOrEmailBackendTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = CustomUser.objects.create_user('Nina', 'nina@example.com', 'nina-password')
+        self.backend = UsernameOrEmailBackend()
+
+    def test_login_by_username_or_email(self):
+        for identifier in ('Nina', 'nina', 'NINA@example.com'):
+            self.assertEqual(authenticate(None, username=identifier, password='nina-password'), self.user)
+        self.assertRedirects(self.client.post(reverse('login'), {'username': 'nina@example.com',
+                                                                 'password': 'nina-password'}),
+                             '/', fetch_redirect_response=False)
+
+    def test_email_wins_over_a_username_that_looks_like_one(self):
+        CustomUser.objects.create_user('nina@example.com', 'other@example.com', 'other-password')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.find_user('nina@example.com'), self.user)
+
+    def test_a_failed_login_runs_one_backend(self):
+        with mock.patch.object(AuthenticationBackend, 'authenticate', return_value=None) as allauth, \
+                mock.patch.object(CustomUser, 'set_password', autospec=True) as dummy_hash, \
+                mock.patch.object(CustomUser, 'check_password', autospec=True, return_value=False) as check:
+            for identifier in ('nina', 'nobody', 'nobody@example.com'):
+                with self.assertNumQueries(1):
+                    self.assertIsNone(authenticate(None, username=identifier, password='wrong'))
+            allauth.assert_not_called()
+            self.assertEqual(check.call_count + dummy_hash.call_count, 3)
+
+            # allauth's forms send email= (and username=) for addresses; only its backend runs then
+            authenticate(None, email='nina@example.com', username='nina@example.com', password='wrong')
+            allauth.assert_called_once()
+            self.assertEqual(check.call_count + dummy_hash.call_count, 3)
+
+    def test_inactive_user_is_stashed_for_allauth(self):
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertIsNone(authenticate(None, username='nina', password='nina-password'))
+        self.assertEqual(AuthenticationBackend.unstash_authenticated_user(), self.user)
+
+    def test_unknown_identifiers_are_cached_until_created(self):
+        self.assertIsNone(self.backend.find_user('Olaf'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.backend.find_user('olaf'))
+
+        olaf = CustomUser.objects.create_user('olaf', 'olaf@example.com', 'olaf-password')
+        self.assertEqual(self.backend.find_user('Olaf'), olaf)
+
+    def test_only_identifier_changes_clear_the_cache(self):
+        self.backend.find_user('nina2')
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertTrue(cache.get(_miss_key('nina2')))
+
+        self.user.username = 'nina2'
+        self.user.save(update_fields=['username'])
+        self.assertIsNone(cache.get(_miss_key('nina2')))
+        self.assertEqual(self.backend.find_user('nina2'), self.user)
+
+
+class AccountPurgeTests(TestCase):
+
+    def test_purge_removes_user_and_related_rows(self):
+        from apps.authentication.deletion import purge_requested_accounts
+        from apps.notifications.models import Notification
+
+        user = CustomUser.objects.create_user('bob', 'bob@example.com', 'bob-password')
+        keep = CustomUser.objects.create_user('carol', 'carol@example.com', 'carol-password')
+        for i in range(3):
+            TrackedEmail.objects.create(user=user, email=f'bob{i}@example.com')
+            Notification.objects.create(user=user, message=f'hello {i}')
+        Notification.objects.create(user=keep, message='hello')
+        Utils.delete_user('bob')
+
+        purge_requested_accounts(batch_size=2)
+
+        self.assertFalse(CustomUser.objects.filter(pk=user.pk).exists())
+        self.assertFalse(TrackedEmail.objects.filter(user_id=user.pk).exists())
+        self.assertFalse(Notification.objects.filter(user_id=user.pk).exists())
+        self.assertTrue(Notification.objects.filter(user=keep).exists())
+
+    def test_deletion_ends_every_session(self):
+        from django.contrib.sessions.models import Session
+
+        user = CustomUser.objects.create_user('dave', 'dave@example.com', 'dave-password')
+        keep = CustomUser.objects.create_user('erin', 'erin@example.com', 'erin-password')
+        other_device = self.client_class()
+        for client, who in ((self.client, user), (other_device, user), (self.client_class(), keep)):
+            client.force_login(who)
+        self.assertEqual(Session.objects.count(), 3)
+
+        self.client.post(reverse('delete_account'))
+        # Logged out everywhere right away, not only where the request came from
+        response = other_device.get(reverse('email_registration'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith('/login/'))
+
+    def test_a_failed_purge_does_not_block_the_queue(self):
+        from apps.authentication.deletion import purge_requested_accounts
+
+        users = [CustomUser.objects.create_user(name, f'{name}@example.com', 'pw') for name in ('fay', 'gus')]
+        for user in users:
+            Utils.delete_user(user.username)
+
+        def delete_directory(path):
+            if path == f'qrcodes/{users[0].pk}':
+                raise OSError('storage is down')
+
+        with mock.patch('apps.authentication.deletion.delete_directory', delete_directory), \
+                self.assertLogs('apps.authentication.deletion', 'ERROR'):
+            purge_requested_accounts(batch_size=10)
+        self.assertEqual(list(CustomUser.objects.filter(pk__in=[u.pk for u in users])), [users[0]])
+
+        purge_requested_accounts(batch_size=10)
+        self.assertFalse(CustomUser.objects.filter(pk=users[0].pk).exists())
+
+
+class AdminChangelistTests(TestCase):
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser('root', 'root@example.com', 'root-password')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:authentication_trackedemail_changelist')
+
+    def add_tracked_emails(self, count):
+        for i in range(count):
+            user = CustomUser.objects.create_user(f'user{TrackedEmail.objects.count()}', '')
+            TrackedEmail.objects.create(user=user, email=f'{user.username}@example.com')
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_tracked_emails(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self.add_tracked_emails(10)
+        with self.assertNumQueries(len(few)):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'user11@example.com')
+
+    def test_username_filter(self):
+        self.add_tracked_emails(3)
+        response = self.client.get(self.url, {'username': 'user1', 'q': 'example'})
+        self.assertContains(response, 'user1@example.com')
+        self.assertNotContains(response, 'user2@example.com')
+        self.assertContains(response, '<input type="hidden" name="q" value="example">')
+
+    def test_search_covers_names_nicknames_and_messages(self):
+        from apps.notifications.models import Notification
+
+        user = CustomUser.objects.create_user('quinn', 'quinn@example.com', first_name='Quentin', last_name='Zappa')
+        TrackedEmail.objects.create(user=user, email='q@example.com', nickname='Workbench')
+        Notification.objects.create(user=user, message='Your parcel has shipped')
+        for model, term in (('customuser', 'quent'), ('customuser', 'zapp'),
+                            ('trackedemail', 'workben'), ('notification', 'parcel')):
+            app = 'notifications' if model == 'notification' else 'authentication'
+            response = self.client.get(reverse(f'admin:{app}_{model}_changelist'), {'q': term})
+            self.assertContains(response, '1 result', msg_prefix=f'{model} ?q={term}')
+
+
+class TrialTests(TestCase):
+
+    def test_new_user_gets_trial_end(self):
+        user = CustomUser.objects.create_user('frank', 'frank@example.com', 'frank-password')
+        self.assertEqual(user.trial_ends_at, user.date_joined + timedelta(days=3))
+        status = trial_status(user)
+        self.assertTrue(status['on_trial'])
+        self.assertEqual(status['days_left'], 3)
+
+    def test_subscribed_user_is_not_on_trial(self):
+        user = CustomUser.objects.create_user('gina', 'gina@example.com', subscribed=True)
+        self.assertFalse(trial_status(user)['on_trial'])
+        self.assertFalse(trial_status(user)['expired'])
+
+    def test_trials_expiring_on(self):
+        today = timezone.localdate()
+        ending = CustomUser.objects.create_user('hank', 'hank@example.com')
+        CustomUser.objects.filter(pk=ending.pk).update(trial_ends_at=timezone.now())
+        CustomUser.objects.create_user('ivy', 'ivy@example.com')
+        CustomUser.objects.create_user('jo', 'jo@example.com', subscribed=True, trial_ends_at=timezone.now())
+        self.assertEqual(list(trials_expiring_on(today)), [ending])
+
+    def test_profile_shows_days_left_without_extra_queries(self):
+        user = CustomUser.objects.create_user('kim', 'kim@example.com', 'kim-password')
+        self.client.force_login(user)
+        with self.assertNumQueries(AUTH_QUERIES + 1):  # + the view's own user refresh
+            response = self.client.get(reverse('profile'))
+        self.assertContains(response, 'Free trial ends in 3 days.')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class TrialReminderTests(TestCase):
+
+    def test_reminders_are_sent_once_in_chunks(self):
+        from django.core import mail
+        from apps.authentication.trials import send_trial_reminders
+        from apps.notifications.models import Notification
+
+        now = timezone.now()
+        for i in range(5):
+            CustomUser.objects.create_user(f'trial{i}', f'trial{i}@example.com', trial_ends_at=now + timedelta(hours=5))
+        CustomUser.objects.create_user('later', 'later@example.com')
+        CustomUser.objects.create_user('paid', 'paid@example.com', subscribed=True, trial_ends_at=now + timedelta(hours=5))
+
+        report = send_trial_reminders(now, now + timedelta(days=1), chunk_size=2)
+        self.assertEqual(report['users'], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(Notification.objects.filter(message__startswith='Your free trial ends').count(), 5)
+
+        self.assertEqual(send_trial_reminders(now, now + timedelta(days=1))['users'], 0)
+
+    def test_failed_mail_leaves_the_chunk_for_the_next_run(self):
+        from smtplib import SMTPException
+        from django.core.mail.backends.locmem import EmailBackend
+        from apps.authentication.trials import send_trial_reminders
+        from apps.notifications.models import Notification
+
+        now = timezone.now()
+        user = CustomUser.objects.create_user('tess', 'tess@example.com', trial_ends_at=now + timedelta(minutes=5))
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=SMTPException('down')), \
+                self.assertLogs('apps.authentication.trials', 'ERROR'):
+            report = send_trial_reminders(now, now + timedelta(days=1))
+        self.assertEqual(report['mail_errors'], 1)
+        user.refresh_from_db()
+        self.assertIsNone(user.trial_reminder_sent_at)
+        self.assertFalse(Notification.objects.filter(user=user).exists())
+
+        report = send_trial_reminders(now, now + timedelta(days=1))
+        self.assertEqual((report['emails'], report['notifications']), (1, 1))
+        user.refresh_from_db()
+        self.assertIsNotNone(user.trial_reminder_sent_at)
+
+    def test_trial_ending_later_today_says_today(self):
+        from apps.authentication.trials import send_trial_reminders
+        from apps.notifications.models import Notification
+
+        now = timezone.localtime().replace(hour=8)
+        user = CustomUser.objects.create_user('uma', 'uma@example.com', trial_ends_at=now + timedelta(hours=2))
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            send_trial_reminders(now, now + timedelta(days=1))
+        self.assertIn('your free trial ends today.', mail.outbox[0].body)
+        self.assertEqual(Notification.objects.get(user=user).message,
+                         'Your free trial ends today. Subscribe to keep your account active.')
+
+        self.client.force_login(user)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            self.assertContains(self.client.get(reverse('profile')), 'Free trial ends today.')
+
+
+class ProfileAPITests(ColumnWriteAssertions, TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('frank', 'frank@example.com', 'frank-password')
+        CustomUser.objects.create_user('grace', 'grace@example.com', 'grace-password')
+        self.client.force_login(self.user)
+        self.url = reverse('profile_api')
+
+    def patch(self, data):
+        return self.client.patch(self.url, json.dumps(data), content_type='application/json')
+
+    def test_get_returns_profile(self):
+        with self.assertNumQueries(AUTH_QUERIES):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['profile']['username'], 'frank')
+
+    def test_patch_writes_only_the_changed_column(self):
+        with self.assertColumnsWritten(CustomUser, 'bio'):
+            response = self.patch({'bio': '<p>Hello</p>', 'first_name': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], ['bio'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, '<p>Hello</p>')
+
+    def test_unchanged_patch_does_not_write(self):
+        with self.assertNumQueries(AUTH_QUERIES):
+            response = self.patch({'first_name': ''})
+        self.assertEqual(response.json()['updated'], [])
+
+    def test_invalid_and_read_only_fields_are_rejected(self):
+        self.assertEqual(self.patch({'website': 'not a url'}).status_code, 400)
+        self.assertEqual(self.patch({'password': 'x'}).status_code, 400)
+        self.assertEqual(self.patch(['bio']).status_code, 400)
+        response = self.patch({'username': 'GRACE'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('A user with that username already exists.', response.json()['errors']['__all__'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, 'frank')
+
+    def test_username_change_logs_out(self):
+        response = self.patch({'username': 'franklin'})
+        self.assertEqual(response.json()['redirect'], reverse('login'))
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+class ColumnWriteTests(ColumnWriteAssertions, TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('heidi', 'heidi@example.com', 'heidi-password',
+                                                   first_name='Heidi', last_name='Klum')
+        self.tracked = TrackedEmail.objects.create(user=self.user, email='work@example.com')
+        self.client.force_login(self.user)
+
+    def test_profile_actions(self):
+        url = reverse('profile')
+        with self.assertColumnsWritten(CustomUser, 'bio'):
+            self.client.post(url, json.dumps({'action': 'edit_bio', 'bio': '<p>Hi</p>'}), content_type='application/json')
+        with self.assertColumnsWritten(CustomUser, 'website'):
+            self.client.post(url, {'action': 'update_website', 'website': 'https://example.com'})
+        with self.assertColumnsWritten(CustomUser, 'first_name'):
+            self.client.post(url, {'action': 'update_name', 'first_name': 'Heide', 'last_name': 'Klum'})
+        with self.assertColumnsWritten(CustomUser, 'social_twitter'):
+            self.client.post(url, {'action': 'edit_social_link', 'social_twitter': 'https://twitter.com/heidi'})
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.last_name), ('Heide', 'Klum'))
+
+    def test_vcard_preferences(self):
+        with self.assertColumnsWritten(CustomUser, 'vcard_include_name', 'vcard_include_email',
+                                       'vcard_include_website', 'vcard_include_bio'):
+            self.client.post(reverse('vcard_qr_page'), {'action': 'update_vcard_preferences', 'vcard_include_name': 'on'})
+
+    def test_mark_notification_as_read(self):
+        notification = Notification.objects.create(user=self.user, message='Hello')
+        with self.assertColumnsWritten(Notification, 'is_read'):
+            response = self.client.post(reverse('notifications:mark_as_read', args=[notification.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(reverse('notifications:mark_as_read', args=[0])).status_code, 404)
+
+    def test_tracked_email_verification(self):
+        url = reverse('email_registration')
+        with self.assertColumnsWritten(TrackedEmail, 'verification_token', 'token_expires_at'):
+            self.client.post(url, {'action': 'resend_verification', 'email_id': self.tracked.id})
+        with self.assertColumnsWritten(TrackedEmail, 'nickname'):
+            self.client.post(url, {'action': 'edit_email', 'email_id': self.tracked.id,
+                                   'email': 'work@example.com', 'nickname': 'Work'})
+        with self.assertColumnsWritten(TrackedEmail, 'email', 'is_verified', 'verification_token', 'token_expires_at'):
+            self.client.post(url, {'action': 'edit_email', 'email_id': self.tracked.id,
+                                   'email': 'office@example.com', 'nickname': 'Work'})
+
+        self.tracked.refresh_from_db()
+        token = issue_verification_token(self.tracked)
+        self.tracked.save(update_fields=['verification_token', 'token_expires_at'])
+        with self.assertColumnsWritten(TrackedEmail, 'is_verified', 'verification_token', 'token_expires_at'):
+            self.client.get(reverse('verify_tracked_email', args=[token]))
+        self.tracked.refresh_from_db()
+        self.assertTrue(self.tracked.is_verified)
+
+
+class AsyncViewTests(ColumnWriteAssertions, TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('ivan', 'ivan@example.com', 'ivan-password')
+        Notification.objects.create(user=self.user, message='Hello')
+        self.client.force_login(self.user)
+
+    async def test_notification_reads_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        with self.settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SERVER_TIMING=True):
+            with self.assertLogs('apps.request_metrics'):
+                response = await self.async_client.get(reverse('notifications:count'))
+        self.assertEqual(response.json(), {'count': 1})
+        # The ORM calls ran in other threads but still count towards this request
+        self.assertIn(f'desc="{AUTH_QUERIES + 1} queries"', response['Server-Timing'])
+
+        response = await self.async_client.get(reverse('notifications:list'))
+        self.assertEqual([n['message'] for n in response.json()['notifications']], ['Hello'])
+
+    def test_use_gravatar_fetches_asynchronously(self):
+        from PIL import Image
+        import httpx
+
+        image = BytesIO()
+        Image.new('RGB', (1000, 1000)).save(image, format='PNG')
+
+        async def fake_get(client, url, **kwargs):
+            return httpx.Response(200, content=image.getvalue(), request=httpx.Request('GET', url))
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root), mock.patch('httpx.AsyncClient.get', fake_get):
+            with self.assertColumnsWritten(CustomUser, 'avatar'):
+                response = self.client.post(reverse('use_gravatar'))
+            self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.avatar.name, 'avatars/gravatar_ivan.png')
+            self.assertEqual(Image.open(self.user.avatar.path).size, (800, 800))
+
+    def test_replacing_a_stale_avatar_deletes_the_current_one(self):
+        from PIL import Image
+        from django.core.files.base import ContentFile
+        from apps.authentication.views import _replace_avatar
+
+        image = BytesIO()
+        Image.new('RGB', (100, 100)).save(image, format='PNG')
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root):
+            stale = CustomUser.objects.get(pk=self.user.pk)
+            # Another request swaps in its avatar after `stale` was loaded
+            self.user.avatar.save('other.png', ContentFile(image.getvalue()))
+            other = self.user.avatar.path
+
+            _replace_avatar(stale, image.getvalue(), 'gravatar_ivan')
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.avatar.name, stale.avatar.name)
+            self.assertTrue(self.user.avatar.storage.exists(self.user.avatar.name))
+            self.assertFalse(os.path.exists(other))
+
+    def test_use_gravatar_hides_upstream_errors(self):
+        import httpx
+
+        async def fake_get(client, url, **kwargs):
+            raise httpx.ConnectError('connect to 10.0.0.7 refused')
+
+        with mock.patch('httpx.AsyncClient.get', fake_get), self.assertLogs('apps.authentication.views', 'ERROR'):
+            response = self.client.post(reverse('use_gravatar'))
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn('10.0.0.7', response.json()['message'])
+
+    @override_settings(SITE_OWNER_MAIL='owner@example.com')
+    def test_contact_us_sends_mail(self):
+        response = self.client.post(reverse('contact_us'), {'subject': 'Hi', 'message': 'Hello there', 'name': 'Ivan'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertIn('Hello there', mail.outbox[0].body)
@@ -0,0 +1,64 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Failed logins are counted per client IP and per username in the shared
+# cache. Once either counter reaches its limit, further attempts are rejected
+# before `authenticate` runs, so a credential-stuffing burst costs a cache
+# lookup per request instead of a full password hash.
+#
+# The username counter also rejects the right password: after
+# LOGIN_THROTTLE_USERNAME_LIMIT failures anyone can lock an account's owner
+# out for up to LOGIN_THROTTLE_WINDOW seconds. That is the price of making a
+# single account expensive to guess against.
+
+
+def client_ip(request):
+    """
+    The address a failed login is counted against.
+
+    Behind LOGIN_THROTTLE_TRUSTED_PROXIES reverse proxies, each of which appends
+    the address it was connected from to X-Forwarded-For (nginx's
+    $proxy_add_x_forwarded_for), the client is the entry that many hops from the
+    right. Entries further left are written by the client and can't be trusted.
+    Without proxies (or a header too short to have passed through them all)
+    REMOTE_ADDR is used.
+    """
+    proxies = settings.LOGIN_THROTTLE_TRUSTED_PROXIES
+    if proxies:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        if len(hops) >= proxies and hops[-proxies]:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _keys(ip, username):
+    username_digest = hashlib.sha256(username.lower().encode('utf-8')).hexdigest()
+    return f'login-fail:ip:{ip}', f'login-fail:user:{username_digest}'
+
+
+def is_blocked(ip, username):
+    ip_key, user_key = _keys(ip, username)
+    counts = cache.get_many([ip_key, user_key])
+    return (counts.get(ip_key, 0) >= settings.LOGIN_THROTTLE_IP_LIMIT
+            or counts.get(user_key, 0) >= settings.LOGIN_THROTTLE_USERNAME_LIMIT)
+
+
+def register_failure(ip, username):
+    for key in _keys(ip, username):
+        # add() starts the window; incr() keeps the original expiry
+        if not cache.add(key, 1, settings.LOGIN_THROTTLE_WINDOW):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, settings.LOGIN_THROTTLE_WINDOW)
+
+
+def reset(username):
+    cache.delete(_keys('', username)[1])
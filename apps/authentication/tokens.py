@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import TrackedEmail
+
+SIGNING_SALT = 'apps.authentication.tracked-email-verification'
+
+# The columns issue_verification_token sets, for save(update_fields=...)
+TOKEN_FIELDS = ['verification_token', 'token_expires_at']
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_verification_token(tracked_email):
+    """
+    Prepare `tracked_email` for verification and return the token for the link.
+    The caller saves the instance.
+
+    'hashed' mode stores only a SHA-256 of a random token plus its expiry;
+    'signed' mode stores nothing and hands out a timestamped signature of the
+    (user, email) pair instead, so invalid links never reach the database;
+    it stops matching once the address is verified, which makes it single-use.
+    """
+    if settings.TRACKED_EMAIL_TOKEN_MODE == 'signed':
+        tracked_email.verification_token = None
+        tracked_email.token_expires_at = None
+        return signing.dumps({'u': tracked_email.user_id, 'e': tracked_email.email}, salt=SIGNING_SALT)
+
+    token = secrets.token_urlsafe(32)
+    tracked_email.verification_token = hash_token(token)
+    tracked_email.token_expires_at = timezone.now() + timedelta(hours=settings.TRACKED_EMAIL_TOKEN_TTL_HOURS)
+    return token
+
+
+def tracked_email_for_token(token):
+    """The TrackedEmail a verification link points to, or None if it is invalid or expired."""
+    if settings.TRACKED_EMAIL_TOKEN_MODE == 'signed':
+        try:
+            payload = signing.loads(token, salt=SIGNING_SALT,
+                                    max_age=timedelta(hours=settings.TRACKED_EMAIL_TOKEN_TTL_HOURS))
+        except signing.BadSignature:
+            return None
+        return TrackedEmail.objects.select_related('user').filter(
+            user_id=payload['u'], email=payload['e'], is_verified=False,
+        ).first()
+
+    return TrackedEmail.objects.select_related('user').filter(
+        verification_token=hash_token(token),
+        token_expires_at__gt=timezone.now(),
+    ).first()
@@ -0,0 +1,125 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import logging
+import time as clock
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def trial_status(user, now=None):
+    """
+    Subscription / trial state of `user`, computed from columns already on the
+    user row, so it costs no queries. `days_left` counts calendar days until
+    the day the trial ends.
+    """
+    now = now or timezone.now()
+    ends_at = user.trial_ends_at
+    days_left = max(0, (timezone.localdate(ends_at) - timezone.localdate(now)).days) if ends_at else 0
+    on_trial = not user.subscribed and ends_at is not None and ends_at > now
+    return {
+        'subscribed': user.subscribed,
+        'on_trial': on_trial,
+        'trial_ends_at': ends_at,
+        'days_left': days_left,
+        'expired': not user.subscribed and not on_trial,
+    }
+
+
+def trials_expiring_between(start, end):
+    """Unsubscribed users whose trial ends in [start, end), served by customuser_trial_ends_idx."""
+    return get_user_model().objects.filter(subscribed=False, trial_ends_at__gte=start, trial_ends_at__lt=end)
+
+
+def trials_expiring_on(day):
+    """Unsubscribed users whose trial ends on the local calendar `day`."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return trials_expiring_between(start, start + timedelta(days=1))
+
+
+def _ends(days_left):
+    """'today' for a trial ending later today, 'in N day(s)' otherwise."""
+    if days_left == 0:
+        return 'today'
+    return f"in {days_left} day{'s' if days_left != 1 else ''}"
+
+
+def reminder_email(user, days_left):
+    return EmailMessage(
+        'Your Kryptisk free trial is ending',
+        f"Hi {user.username}, your free trial ends {_ends(days_left)}. Subscribe to keep tracking your emails.",
+        settings.EMAIL_SENDER,
+        [user.email],
+    )
+
+
+def send_trial_reminders(start, end, chunk_size=1000, dry_run=False):
+    """
+    Remind every unsubscribed user whose trial ends in [start, end) and who
+    hasn't been reminded yet. Users are streamed `chunk_size` at a time; each
+    chunk gets one SMTP connection for its mails, then one bulk INSERT of
+    notifications and one UPDATE marking it done, so memory stays flat however
+    many users match. A chunk whose mails fail is left unmarked and without
+    notifications, so the next run retries it. Returns a report with counts
+    and throughput.
+    """
+    from apps.notifications.models import Notification
+
+    started = clock.perf_counter()
+    now = timezone.now()
+    users = (
+        trials_expiring_between(start, end)
+        .filter(trial_reminder_sent_at__isnull=True)
+        .only('pk', 'username', 'email', 'subscribed', 'trial_ends_at')
+        .order_by('trial_ends_at', 'pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    report = {'users': 0, 'notifications': 0, 'emails': 0, 'mail_errors': 0}
+
+    def flush(chunk):
+        report['users'] += len(chunk)
+        if dry_run:
+            return
+        notifications, messages = [], []
+        for user in chunk:
+            days_left = trial_status(user, now)['days_left']
+            notifications.append(Notification(
+                user_id=user.pk,
+                message=f"Your free trial ends {_ends(days_left)}. Subscribe to keep your account active.",
+            ))
+            if user.email:
+                messages.append(reminder_email(user, days_left))
+        if messages:
+            try:
+                report['emails'] += get_connection(fail_silently=False).send_messages(messages) or 0
+            except Exception:
+                logger.exception('Could not send %d trial reminder(s); the chunk will be retried', len(messages))
+                report['mail_errors'] += len(messages)
+                return
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications)
+            get_user_model().objects.filter(pk__in=[user.pk for user in chunk]).update(trial_reminder_sent_at=now)
+        report['notifications'] += len(notifications)
+
+    chunk = []
+    for user in users:
+        chunk.append(user)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    elapsed = clock.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['users'] / elapsed, 1) if elapsed else None
+    return report
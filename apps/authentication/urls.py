@@ -6,14 +6,19 @@ Copyright (c) 2019 - present AppSeed.us
 from django.urls import path
 from .views import (
     login_view, register_user, profile, delete_account, email_registration_view,
-    verify_tracked_email # Added verify_tracked_email
+    verify_tracked_email, # Added verify_tracked_email
+    bulk_tracked_emails_view, profile_api_view, use_gravatar_view, contact_us_view,
 )
 
 urlpatterns = [
     path('login/', login_view, name='login'),
     path('register/', register_user, name='register'),
     path('profile/', profile, name='profile'),
+    path('profile/gravatar/', use_gravatar_view, name='use_gravatar'),
+    path('profile/contact/', contact_us_view, name='contact_us'),
+    path('api/profile/', profile_api_view, name='profile_api'),
     path('delete-account/', delete_account, name='delete_account'),
     path('email-registration/', email_registration_view, name='email_registration'),
+    path('email-registration/bulk/', bulk_tracked_emails_view, name='bulk_tracked_emails'),
     path('verify-email/<str:token>/', verify_tracked_email, name='verify_tracked_email'), # New URL pattern
 ]
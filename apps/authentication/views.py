@@ -5,56 +5,70 @@ Copyright (c) 2019 - present AppSeed.us
 
 # Create your views here.
 import json
+import logging
 import os
 import time # Import for time.time_ns()
 import hashlib
-import uuid
-import requests
-from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model # Import for explicitly refreshing user object
 
+from asgiref.sync import sync_to_async
 from django.core.mail import send_mail
-from django.http import JsonResponse, HttpResponseRedirect
-from django.shortcuts import render, redirect, get_object_or_404 # Added get_object_or_404
+from django.http import Http404, JsonResponse, HttpResponseRedirect
+from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.forms import modelform_factory
+from django.views.decorators.http import require_POST, require_http_methods
+from django.conf import settings
 from django.contrib import messages
 from django.db import IntegrityError
-from .forms import LoginForm, SignUpForm, ProfileForm, TrackedEmailForm
+from .forms import LoginForm, SignUpForm, ProfileForm, ProfileAPIForm, TrackedEmailForm
 from .models import TrackedEmail
+from .tokens import TOKEN_FIELDS, issue_verification_token, tracked_email_for_token
+from .bulk import bulk_add_tracked_emails, parse_rows, verification_email
+from . import throttle
 from apps.notifications.models import Notification
 from apps import Utils
-from core.settings import *
-from allauth.account.models import EmailAddress
-from datetime import timedelta # Import datetime for trial calculation
-from django.utils import timezone # Import timezone for current date
+from apps.utils.storage import delete_file, download_url, is_object_storage
+
+logger = logging.getLogger(__name__)
 
 
 def login_view(request):
     form = LoginForm(request.POST or None)
 
     msg = None
+    status = 200
 
     if request.method == "POST":
 
         if form.is_valid():
             username = form.cleaned_data.get("username")
             password = form.cleaned_data.get("password")
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                return redirect("/")
+            ip = throttle.client_ip(request)
+            # Reject throttled clients before paying for a password hash
+            if throttle.is_blocked(ip, username):
+                msg = 'Too many login attempts. Please try again later.'
+                status = 429
             else:
-                msg = 'Invalid credentials'
+                user = authenticate(request, username=username, password=password)
+                if user is not None:
+                    throttle.reset(username)
+                    login(request, user)
+                    return redirect("/")
+                else:
+                    throttle.register_failure(ip, username)
+                    msg = 'Invalid credentials'
         else:
             msg = 'Error validating the form'
 
     return render(request, "accounts/login.html", {"form": form, "msg": msg,
-                                                   "github_login": GITHUB_AUTH, "twitter_login": TWITTER_AUTH})
+                                                   "github_login": settings.GITHUB_AUTH, "twitter_login": settings.TWITTER_AUTH},
+                  status=status)
 
 
 def register_user(request):
@@ -71,6 +85,7 @@ def register_user(request):
 
             # Send email confirmation using allauth helper
             if user.email:
+                from allauth.account.models import EmailAddress
                 EmailAddress.objects.add_email(request, user, user.email, signup=True, confirm=True)
 
             # Create a welcome notification
@@ -90,39 +105,100 @@ def register_user(request):
     return render(request, "accounts/register.html", {"form": form, "msg": msg, "success": success})
 
 
-def profile(request):
-    # Define trial duration
-    TRIAL_DURATION_DAYS = 3
+def _save_submitted_changes(form, data):
+    """
+    Save only the fields of a valid ProfileForm that were submitted and changed.
+    Fields left out of `data` would otherwise be blanked by the ModelForm.
+    """
+    update_fields = [name for name in form.changed_data if name in data]
+    if update_fields:
+        form.instance.save(update_fields=update_fields)
+
+
+def _resized_avatar(source, name, append_extension=False):
+    """
+    Shrink the image in `source` (a file-like object) to at most 800x800 and
+    return it as an upload ready to assign to `avatar`.
+    """
+    from PIL import Image  # imported on first use to keep worker startup light
 
+    img = Image.open(source)
+
+    max_size = (800, 800)
+    if img.width > max_size[0] or img.height > max_size[1]:
+        img.thumbnail(max_size, Image.LANCZOS)
+
+    img_format = img.format if img.format else 'PNG'
+    if img_format.upper() not in ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP']:
+        img_format = 'PNG'
+
+    if img_format.upper() == 'JPEG' and img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+
+    output = BytesIO()
+    img.save(output, format=img_format, quality=85)
+    output.seek(0)
+
+    if append_extension:
+        name = f'{name}.{img_format.lower()}'
+    return InMemoryUploadedFile(
+        output,
+        'ImageField',
+        name,
+        f'image/{img_format.lower()}',
+        output.getbuffer().nbytes,
+        None
+    )
+
+
+def _replace_avatar(user, content, name):
+    """
+    Resize `content`, store it as `user`'s avatar and delete the file it replaced.
+
+    The column is swapped with an UPDATE that only matches the name we expect
+    to replace; if a concurrent request got there first we re-read and retry.
+    So each request deletes exactly the file its new one replaced, instead of
+    all of them deleting the same stale file and leaving their own behind.
+    """
+    upload = _resized_avatar(BytesIO(content), name, append_extension=True)
+    replaced = user.avatar.name
+    user.avatar.save(upload.name, upload, save=False)
+
+    users = get_user_model().objects.filter(pk=user.pk)
+    while not users.filter(avatar=replaced).update(avatar=user.avatar.name):
+        replaced = users.values_list('avatar', flat=True).get()
+    delete_file(type(user.avatar)(user, user.avatar.field, replaced))
+
+
+def profile(request):
     # GET request handler
     if request.method == 'GET':
         # Get fresh user data from database to ensure no caching
         User = get_user_model()
         fresh_user = User.objects.get(pk=request.user.pk)
-        
-        # Calculate trial days left using fresh user data
-        days_left = None
-        if fresh_user.date_joined:
-            # Calculate days since registration
-            today = timezone.now().date()
-            days_since_registration = (today - fresh_user.date_joined.date()).days
-            
-            # Calculate remaining trial days
-            days_left = max(0, TRIAL_DURATION_DAYS - days_since_registration)
-        
+
         cache_buster = time.time_ns() # Get nanosecond precision for aggressive cache busting
+
+        # Presigned object-storage URLs are unique per request already and would
+        # break if a query string were appended, so only bust local media URLs.
+        avatar_url = None
+        if fresh_user.avatar:
+            avatar_url = download_url(fresh_user.avatar.name)
+            if not is_object_storage():
+                avatar_url = f'{avatar_url}?v={cache_buster}'
+
         return render(request, "accounts/user-profile.html", context={
             'bio': fresh_user.bio,
-            'days_left_on_trial': days_left, # Pass days left to the template
             'contact_us_info': {
-                'phone': SITE_OWNER_PHONE,
-                'email': SITE_OWNER_MAIL,
-                'address': SITE_OWNER_ADDRESS,
-                'facebook': SITE_OWNER_FBK,
-                'twitter': SITE_OWNER_TWITTER,
-                'instagram': SITE_OWNER_INSTAGRAM,
+                'phone': settings.SITE_OWNER_PHONE,
+                'email': settings.SITE_OWNER_MAIL,
+                'address': settings.SITE_OWNER_ADDRESS,
+                'facebook': settings.SITE_OWNER_FBK,
+                'twitter': settings.SITE_OWNER_TWITTER,
+                'instagram': settings.SITE_OWNER_INSTAGRAM,
             },
             'cache_buster': cache_buster, # Pass the nanosecond timestamp to the template
+            'avatar_url': avatar_url,
             # 'debug' is automatically available in templates when DEBUG=True in settings.py
             # via django.template.context_processors.debug if configured in TEMPLATES options.
         })
@@ -140,20 +216,6 @@ def profile(request):
 
     action = body.get('action')
 
-    if action == 'contact_us':
-        subject = body.get('subject')
-        email = body.get('email', request.user.email)
-        message = body.get('message')
-        name = body.get('name')
-
-        try:
-            send_mail(subject, f'sender: {request.user} - {name} - {email} \nmessage: \n{message}',
-                      EMAIL_SENDER, [SITE_OWNER_MAIL])
-            return JsonResponse({'message': 'message successfully sent.'}, status=200)
-        except Exception as e:
-            print(f'There is an error in sending email: {str(e)}')
-            return JsonResponse({'message': 'Error sending email. Please review settings.'}, status=400)
-
     if action == 'upload_avatar':
         # Store the current avatar's FieldFile object *before* any updates
         old_avatar = request.user.avatar if request.user.avatar else None
@@ -161,42 +223,18 @@ def profile(request):
         form = ProfileForm(request.POST, request.FILES, instance=request.user)
 
         if form.is_valid():
+            started = time.perf_counter()
             if 'avatar' in request.FILES and request.FILES['avatar']:
                 avatar_file = request.FILES['avatar']
-                img = Image.open(avatar_file)
-
-                max_size = (800, 800)
-                if img.width > max_size[0] or img.height > max_size[1]:
-                    img.thumbnail(max_size, Image.LANCZOS)
+                request.user.avatar = _resized_avatar(avatar_file, avatar_file.name)
 
-                img_format = img.format if img.format else 'PNG'
-                if img_format.upper() not in ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP']:
-                    img_format = 'PNG'
-
-                if img_format.upper() == 'JPEG' and img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-
-                output = BytesIO()
-                img.save(output, format=img_format, quality=85)
-                output.seek(0)
-
-                request.user.avatar = InMemoryUploadedFile(
-                    output,
-                    'ImageField',
-                    avatar_file.name,
-                    f'image/{img_format.lower()}',
-                    output.getbuffer().nbytes,
-                    None
-                )
-
-            request.user.save()
+            request.user.save(update_fields=['avatar'])
+            if settings.METRICS_ENABLED:
+                from apps.utils import metrics
+                metrics.observe_avatar('upload', time.perf_counter() - started)
 
             # Delete the old avatar file after the new one has been successfully saved
-            if old_avatar and old_avatar.name and old_avatar.storage.exists(old_avatar.name):
-                try:
-                    old_avatar.delete(save=False)
-                except Exception as e:
-                    print(f"Error deleting old avatar file '{old_avatar.name}': {e}") # Debug message
+            delete_file(old_avatar)
 
             return HttpResponseRedirect(request.path)
 
@@ -204,85 +242,21 @@ def profile(request):
             'message': form.errors
         }, status=400)
 
-    if action == 'use_gravatar':
-        if not request.user.email:
-            return JsonResponse({'message': 'No email associated with your account to fetch Gravatar. Please add an email address to use this feature.'}, status=400)
-
-        # Store the current avatar's FieldFile object *before* any updates
-        old_avatar = request.user.avatar if request.user.avatar else None
-
-        email_hash = hashlib.md5(request.user.email.lower().strip().encode('utf-8')).hexdigest()
-        # requesting size 800 to ensure good quality if resized
-        gravatar_url = f"https://www.gravatar.com/avatar/{email_hash}?d=identicon&s=800"
-
-        try:
-            response = requests.get(gravatar_url, stream=True)
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-            img = Image.open(BytesIO(response.content))
-
-            max_size = (800, 800)
-            if img.width > max_size[0] or img.height > max_size[1]:
-                img.thumbnail(max_size, Image.LANCZOS)
-
-            img_format = img.format if img.format else 'PNG'
-            if img_format.upper() not in ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP']:
-                img_format = 'PNG'
-
-            if img_format.upper() == 'JPEG' and img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-
-            output = BytesIO()
-            img.save(output, format=img_format, quality=85)
-            output.seek(0)
-
-            gravatar_filename = f"gravatar_{request.user.username}.{img_format.lower()}"
-            request.user.avatar = InMemoryUploadedFile(
-                output,
-                'ImageField',
-                gravatar_filename,
-                f'image/{img_format.lower()}',
-                output.getbuffer().nbytes,
-                None
-            )
-            request.user.save()
-
-            # Delete the old avatar file after the new one has been successfully saved
-            if old_avatar and old_avatar.name and old_avatar.storage.exists(old_avatar.name):
-                try:
-                    old_avatar.delete(save=False)
-                except Exception as e:
-                    print(f"Error deleting old avatar file '{old_avatar.name}': {e}") # Debug message
-
-            return HttpResponseRedirect(request.path)
-
-        except requests.exceptions.RequestException as e:
-            return JsonResponse({'message': f'Error fetching Gravatar: {e}'}, status=500)
-        except Exception as e:
-            return JsonResponse({'message': f'Error processing Gravatar image: {e}'}, status=500)
-
     if action == 'reset_avatar':
         if request.user.avatar:
-            # Delete the file from the filesystem if it exists
-            if request.user.avatar.name and request.user.avatar.storage.exists(request.user.avatar.name):
-                try:
-                    request.user.avatar.delete(save=False)
-                except Exception as e:
-                    print(f"Error deleting avatar file '{request.user.avatar.name}': {e}")
+            # Delete the file from storage (local media or object storage)
+            delete_file(request.user.avatar)
             # Clear the avatar field in the database
             request.user.avatar = None
-            request.user.save()
+            request.user.save(update_fields=['avatar'])
 
-            # Refresh the user object from the database
-            request.user.refresh_from_db()
-            
         return HttpResponseRedirect(request.path)
 
     if action == 'update_name':
         form = ProfileForm(request.POST, request.FILES, instance=request.user)
 
         if form.is_valid():
-            form.save()
+            _save_submitted_changes(form, request.POST)
             return HttpResponseRedirect(request.path)
 
         return JsonResponse({
@@ -292,7 +266,7 @@ def profile(request):
     if action == 'edit_bio':
         bio_content = body.get('bio', '')
         request.user.bio = bio_content
-        request.user.save()
+        request.user.save(update_fields=['bio'])
         return HttpResponseRedirect(request.path)
 
     # NEW: Handle website update
@@ -300,7 +274,7 @@ def profile(request):
         website_url = body.get('website', '').strip()
         # Set to None if an empty string is submitted to allow NULL in the database
         request.user.website = website_url if website_url else None
-        request.user.save()
+        request.user.save(update_fields=['website'])
         return HttpResponseRedirect(request.path)
 
     # Handle username update
@@ -309,7 +283,7 @@ def profile(request):
         if new_username and new_username != request.user.username:
             try:
                 request.user.username = new_username
-                request.user.save()
+                request.user.save(update_fields=['username'])
                 # Log out the user after username change
                 logout(request)
                 return HttpResponseRedirect('/login/')
@@ -321,7 +295,7 @@ def profile(request):
         form = ProfileForm(request.POST, request.FILES, instance=request.user)
 
         if form.is_valid():
-            form.save()
+            _save_submitted_changes(form, request.POST)
             return JsonResponse({
                 'message': 'Profile updated successfully.'
             }, status=200)
@@ -334,6 +308,122 @@ def profile(request):
     return JsonResponse({'message': 'Invalid action or request not processed.'}, status=400)
 
 
+# The two views below are async: under ASGI (GUNICORN_WORKER_MODE=uvicorn) a
+# request waiting on Gravatar or SMTP doesn't hold a worker or thread. Blocking
+# work (image resizing, storage, smtplib) runs in a thread via sync_to_async.
+
+@login_required(login_url="/login/")
+@require_POST
+async def use_gravatar_view(request):
+    user = await request.auser()
+    if not user.email:
+        return JsonResponse({'message': 'No email associated with your account to fetch Gravatar. Please add an email address to use this feature.'}, status=400)
+
+    import httpx
+
+    email_hash = hashlib.md5(user.email.lower().strip().encode('utf-8')).hexdigest()
+    # requesting size 800 to ensure good quality if resized
+    gravatar_url = f"{settings.GRAVATAR_URL}{email_hash}?d=identicon&s=800"
+
+    try:
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=settings.GRAVATAR_TIMEOUT) as client:
+            response = await client.get(gravatar_url)
+            response.raise_for_status() # Raise HTTPStatusError for bad responses (4xx or 5xx)
+
+        await sync_to_async(_replace_avatar)(user, response.content, f'gravatar_{user.username}')
+        if settings.METRICS_ENABLED:
+            from apps.utils import metrics
+            metrics.observe_avatar('gravatar', time.perf_counter() - started)
+
+        return HttpResponseRedirect(reverse('profile'))
+
+    except httpx.HTTPError:
+        logger.exception('Fetching the Gravatar for user %s failed', user.pk)
+        return JsonResponse({'message': 'Could not fetch your Gravatar. Please try again later.'}, status=500)
+    except Exception:
+        logger.exception('Storing the Gravatar for user %s failed', user.pk)
+        return JsonResponse({'message': 'Could not process your Gravatar image. Please try again later.'}, status=500)
+
+
+@login_required(login_url="/login/")
+@require_POST
+async def contact_us_view(request):
+    user = await request.auser()
+    if 'multipart/form-data' in request.content_type or 'urlencoded' in request.content_type:
+        body = request.POST
+    else:
+        try:
+            body = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'message': 'Request body must be JSON or form data.'}, status=400)
+
+    subject = body.get('subject')
+    email = body.get('email', user.email)
+    message = body.get('message')
+    name = body.get('name')
+
+    try:
+        await sync_to_async(send_mail, thread_sensitive=False)(
+            subject, f'sender: {user} - {name} - {email} \nmessage: \n{message}',
+            settings.EMAIL_SENDER, [settings.SITE_OWNER_MAIL],
+        )
+        return JsonResponse({'message': 'message successfully sent.'}, status=200)
+    except Exception:
+        logger.exception('Sending the contact form of user %s failed', user.pk)
+        return JsonResponse({'message': 'Error sending email. Please review settings.'}, status=400)
+
+
+def _profile_payload(user):
+    data = {name: getattr(user, name) for name in ProfileAPIForm._meta.fields}
+    data['email'] = user.email
+    data['avatar_url'] = download_url(user.avatar.name) if user.avatar else None
+    return data
+
+
+@login_required(login_url="/login/")
+@require_http_methods(['GET', 'PATCH'])
+def profile_api_view(request):
+    """
+    JSON read and partial update of the signed-in user's profile.
+
+    PATCH takes an object with any of ProfileAPIForm's fields and writes only
+    the columns whose value actually changed. Changing the username logs the
+    user out, as the profile page has always done.
+    """
+    if request.method == 'GET':
+        return JsonResponse({'profile': _profile_payload(request.user)})
+
+    try:
+        patch = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'message': 'Request body must be JSON.'}, status=400)
+    if not isinstance(patch, dict) or not patch:
+        return JsonResponse({'message': 'Expected a non-empty JSON object.'}, status=400)
+
+    unknown = sorted(set(patch) - set(ProfileAPIForm._meta.fields))
+    if unknown:
+        return JsonResponse({'message': f"Unknown or read-only field(s): {', '.join(unknown)}"}, status=400)
+
+    form = modelform_factory(get_user_model(), form=ProfileAPIForm, fields=list(patch))(data=patch, instance=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    updated = form.changed_data
+    if updated:
+        try:
+            form.instance.save(update_fields=updated)
+        except IntegrityError:
+            # Lost a race with another signup for the same username
+            return JsonResponse({'errors': {'username': ['Username already exists.']}}, status=409)
+
+    response = {'profile': _profile_payload(form.instance), 'updated': updated}
+    if 'username' in updated:
+        logout(request)
+        response['redirect'] = reverse('login')
+    return JsonResponse(response)
+
+
 def delete_account(request):
     result, message = Utils.delete_user(request.user.username)
     if not result:
@@ -344,16 +434,39 @@ def delete_account(request):
     return HttpResponseRedirect('/')
 
 
+def _tracked_email_snapshot(user):
+    """
+    Load all of the user's tracked emails with a single query. Everything the
+    view needs (the list, the primary email's entry, the limit count and
+    lookups by id) is derived from this snapshot instead of separate queries.
+    """
+    tracked_emails = list(TrackedEmail.objects.filter(user=user))
+    primary = next((tracked_email for tracked_email in tracked_emails if tracked_email.email == user.email), None)
+    return {
+        'tracked_emails': tracked_emails,
+        'primary': primary,
+        'non_primary_count': len(tracked_emails) - (1 if primary else 0),
+        'by_id': {str(tracked_email.id): tracked_email for tracked_email in tracked_emails},
+    }
+
+
+def _send_verification_email(request, token, recipient):
+    verification_link = request.build_absolute_uri(
+        reverse('verify_tracked_email', kwargs={'token': token})
+    )
+    verification_email(verification_link, recipient).send(fail_silently=False)
+
+
 @login_required(login_url="/login/")
 def email_registration_view(request):
-    # Calculate non_primary_tracked_emails_count for template and add_email logic
-    non_primary_tracked_emails_count = TrackedEmail.objects.filter(user=request.user).exclude(email=request.user.email).count()
+    snapshot = _tracked_email_snapshot(request.user)
+    # Controls the limit for adding new emails; the primary email doesn't count towards it
+    non_primary_tracked_emails_count = snapshot['non_primary_count']
 
     if request.method == 'POST':
         action = request.POST.get('action')
         
         if action == 'add_email':
-            # `non_primary_tracked_emails_count` controls the limit for adding new emails
             form = TrackedEmailForm(request.POST)
             if form.is_valid():
                 email_to_track = form.cleaned_data['email']
@@ -361,66 +474,47 @@ def email_registration_view(request):
                 if email_to_track == request.user.email:
                     Notification.objects.create(user=request.user, message='Your primary email is managed via the dedicated checkbox. Please add other email addresses here.')
                     return redirect('email_registration')
-                elif non_primary_tracked_emails_count >= 2: # Changed to use non_primary_tracked_emails_count
-                    Notification.objects.create(user=request.user, message='You have reached the maximum of 2 additional tracked emails. Please remove an existing email to add a new one.')
+                elif any(tracked_email.email == email_to_track for tracked_email in snapshot['tracked_emails']):
+                    Notification.objects.create(user=request.user, message='This email address is already being tracked for your account.')
+                    return redirect('email_registration')
+                elif non_primary_tracked_emails_count >= settings.TRACKED_EMAIL_LIMIT:
+                    Notification.objects.create(user=request.user, message=f'You have reached the maximum of {settings.TRACKED_EMAIL_LIMIT} additional tracked emails. Please remove an existing email to add a new one.')
                     return redirect('email_registration')
                 else:
                     try:
                         tracked_email = form.save(commit=False)
                         tracked_email.user = request.user
                         tracked_email.is_verified = False
-                        tracked_email.verification_token = uuid.uuid4().hex
+                        token = issue_verification_token(tracked_email)
                         tracked_email.save()
 
-                        # Send verification email
-                        verification_link = request.build_absolute_uri(
-                            reverse('verify_tracked_email', kwargs={'token': tracked_email.verification_token})
-                        )
-                        subject = 'Verify Your Email for Kryptisk Tracking'
-                        message_body = f"Please click the link to verify your email address for tracking: {verification_link}"
-                        send_mail(
-                            subject,
-                            message_body,
-                            EMAIL_SENDER,
-                            [tracked_email.email],
-                            fail_silently=False,
-                        )
-                        
+                        _send_verification_email(request, token, tracked_email.email)
+
                         Notification.objects.create(user=request.user, message='Email address added. A verification email has been sent.')
                         return redirect('email_registration')
                     except IntegrityError:
                         Notification.objects.create(user=request.user, message='This email address is already being tracked for your account.')
                         return redirect('email_registration')
-            else:
-                # Form is invalid, it will be re-rendered with errors, so no generic notification is needed.
-                pass
-
-            # If we fall through, re-render the page with form errors
-            tracked_emails = TrackedEmail.objects.filter(user=request.user)
-            # is_primary_email_tracked is already calculated and used in context for GET request,
-            # so it needs to be calculated again here to pass to the context for POST
-            is_primary_email_tracked = TrackedEmail.objects.filter(user=request.user, email=request.user.email).exists()
 
+            # Form is invalid: re-render the page with its errors from the same snapshot
             context = {
-                'tracked_emails': tracked_emails,
-                'non_primary_tracked_emails_count': non_primary_tracked_emails_count, # Pass for re-rendering form
+                'tracked_emails': snapshot['tracked_emails'],
+                'non_primary_tracked_emails_count': non_primary_tracked_emails_count,
                 'form': form,
                 'segment': 'email-registration',
-                'is_primary_email_tracked': is_primary_email_tracked,
+                'is_primary_email_tracked': snapshot['primary'] is not None,
+                'tracked_email_limit': settings.TRACKED_EMAIL_LIMIT,
             }
             return render(request, 'accounts/email-registration.html', context)
         
         elif action == 'toggle_primary_email_tracking':
             primary_email = request.user.email
             track_primary = request.POST.get('track_primary_email_checkbox') == 'on' 
-            
-            primary_email_tracked_obj = TrackedEmail.objects.filter(user=request.user, email=primary_email).first()
-            # This count (excluding primary) is correctly used for this specific action's limit check
-            current_non_primary_tracked_emails_count_for_toggle = TrackedEmail.objects.filter(user=request.user).exclude(email=primary_email).count()
+            primary_email_tracked_obj = snapshot['primary']
 
             if track_primary: # User wants to track primary email
                 if not primary_email_tracked_obj: # If it's not already tracked
-                    if current_non_primary_tracked_emails_count_for_toggle < 2: # Check if there's space for primary + 1 more (max 2 total, excluding potential primary which IS being added)
+                    if non_primary_tracked_emails_count < settings.TRACKED_EMAIL_LIMIT: # Same limit check as add_email, kept for the primary email as well
                         try:
                             # Create new TrackedEmail for primary email
                             TrackedEmail.objects.create(
@@ -433,150 +527,150 @@ def email_registration_view(request):
                         except IntegrityError:
                             Notification.objects.create(user=request.user, message='Your primary email is already tracked.')
                     else:
-                        Notification.objects.create(user=request.user, message='You have reached the maximum of 2 additional tracked emails. Please untrack another email to track your primary email.')
+                        Notification.objects.create(user=request.user, message=f'You have reached the maximum of {settings.TRACKED_EMAIL_LIMIT} additional tracked emails. Please untrack another email to track your primary email.')
                 elif not primary_email_tracked_obj.is_verified:
                     # If it exists but wasn't verified (shouldn't happen for primary, but for robustness)
                     primary_email_tracked_obj.is_verified = True
                     primary_email_tracked_obj.verification_token = None
-                    primary_email_tracked_obj.save()
+                    primary_email_tracked_obj.token_expires_at = None
+                    primary_email_tracked_obj.save(update_fields=['is_verified', *TOKEN_FIELDS])
                     Notification.objects.create(user=request.user, message='Your primary email is now being tracked and verified.')
                 else:
                     Notification.objects.create(user=request.user, message='Your primary email is already being tracked.')
             else: # User wants to untrack primary email
                 if primary_email_tracked_obj:
-                    # It's important to only remove if it's the primary email object
-                    # This prevents accidentally removing another tracked email if for some reason
-                    # its email address matches the primary_email although it shouldn't be the case
-                    # based on the unique_together constraint and current logic.
-                    if primary_email_tracked_obj.email == primary_email:
-                        primary_email_tracked_obj.delete()
-                        Notification.objects.create(user=request.user, message='Your primary email is no longer being tracked.')
+                    primary_email_tracked_obj.delete()
+                    Notification.objects.create(user=request.user, message='Your primary email is no longer being tracked.')
                 else:
                     Notification.objects.create(user=request.user, message='Your primary email was not being tracked.')
             
             return redirect('email_registration')
 
         elif action == 'edit_email':
-            email_id = request.POST.get('email_id')
+            tracked_email = snapshot['by_id'].get(request.POST.get('email_id'))
+            if tracked_email is None:
+                Notification.objects.create(user=request.user, message='Email not found.')
+                return redirect('email_registration')
+
             try:
-                tracked_email = TrackedEmail.objects.get(id=email_id, user=request.user)
                 original_email = tracked_email.email
                 form = TrackedEmailForm(request.POST, instance=tracked_email)
                 if form.is_valid():
                     new_email = form.cleaned_data['email']
                     if new_email == request.user.email and original_email != request.user.email:
                         Notification.objects.create(user=request.user, message='Your primary email is managed via the dedicated checkbox. You cannot set another tracked email to be your primary email through this edit function.')
-                    elif TrackedEmail.objects.filter(user=request.user, email=new_email).exclude(id=tracked_email.id).exists():
+                    elif any(other.email == new_email and other.id != tracked_email.id for other in snapshot['tracked_emails']):
                          Notification.objects.create(user=request.user, message='This email address is already being tracked for your account.')
                     else:
                         instance = form.save(commit=False)
+                        update_fields = list(form.changed_data)
                         if new_email != original_email:
                             instance.is_verified = False
-                            instance.verification_token = uuid.uuid4().hex
+                            token = issue_verification_token(instance)
+                            update_fields += ['is_verified', *TOKEN_FIELDS]
                             
                             # Send verification email for the new address
-                            verification_link = request.build_absolute_uri(
-                                reverse('verify_tracked_email', kwargs={'token': instance.verification_token})
-                            )
-                            subject = 'Verify Your Email for Kryptisk Tracking'
-                            message_body = f"Please click the link to verify your email address for tracking: {verification_link}"
-                            send_mail(
-                                subject,
-                                message_body,
-                                EMAIL_SENDER,
-                                [new_email],
-                                fail_silently=False,
-                            )
+                            _send_verification_email(request, token, new_email)
                             Notification.objects.create(user=request.user, message='Email updated. A verification email has been sent to the new address.')
                         else:
                             Notification.objects.create(user=request.user, message='Email details updated successfully.')
                         
-                        instance.save()
+                        if update_fields:
+                            instance.save(update_fields=update_fields)
                 else:
                     Notification.objects.create(user=request.user, message='Update failed. Please check the details.')
-            except TrackedEmail.DoesNotExist:
-                Notification.objects.create(user=request.user, message='Email not found.')
             except IntegrityError: 
                 Notification.objects.create(user=request.user, message='This email address is already being tracked for your account.')
             return redirect('email_registration')
 
         elif action == 'remove_email':
-            email_id = request.POST.get('email_id')
-            try:
-                tracked_email = TrackedEmail.objects.get(id=email_id, user=request.user)
-                if tracked_email.email == request.user.email:
-                    Notification.objects.create(user=request.user, message='You cannot remove your primary email directly. Please uncheck the "Track this email" box next to it.')
-                else:
-                    tracked_email.delete()
-                    Notification.objects.create(user=request.user, message='Email address removed successfully.')
-            except TrackedEmail.DoesNotExist:
+            tracked_email = snapshot['by_id'].get(request.POST.get('email_id'))
+            if tracked_email is None:
                 Notification.objects.create(user=request.user, message='Email not found.')
+            elif tracked_email.email == request.user.email:
+                Notification.objects.create(user=request.user, message='You cannot remove your primary email directly. Please uncheck the "Track this email" box next to it.')
+            else:
+                tracked_email.delete()
+                Notification.objects.create(user=request.user, message='Email address removed successfully.')
             return redirect('email_registration')
 
         elif action == 'resend_verification':
-            email_id = request.POST.get('email_id')
-            try:
-                tracked_email = get_object_or_404(TrackedEmail, id=email_id, user=request.user)
+            tracked_email = snapshot['by_id'].get(request.POST.get('email_id'))
+            if tracked_email is None:
+                Notification.objects.create(user=request.user, message='Email not found or unauthorized.')
+                return redirect('email_registration')
 
+            try:
                 if tracked_email.is_verified:
                     Notification.objects.create(user=request.user, message=f'The email address {tracked_email.email} is already verified.')
                 else:
                     # Generate a new verification token
-                    tracked_email.verification_token = uuid.uuid4().hex
-                    tracked_email.save()
+                    token = issue_verification_token(tracked_email)
+                    tracked_email.save(update_fields=TOKEN_FIELDS)
 
                     # Send verification email with the new token
-                    verification_link = request.build_absolute_uri(
-                        reverse('verify_tracked_email', kwargs={'token': tracked_email.verification_token})
-                    )
-                    subject = 'Verify Your Email for Kryptisk Tracking'
-                    message_body = f"Please click the link to verify your email address for tracking: {verification_link}"
-                    send_mail(
-                        subject,
-                        message_body,
-                        EMAIL_SENDER,
-                        [tracked_email.email],
-                        fail_silently=False,
-                    )
+                    _send_verification_email(request, token, tracked_email.email)
                     Notification.objects.create(user=request.user, message=f'A new verification email has been sent to {tracked_email.email}. Please check your inbox.')
 
-            except TrackedEmail.DoesNotExist:
-                Notification.objects.create(user=request.user, message='Email not found or unauthorized.')
-            except Exception as e:
-                print(f'Error resending verification email: {e}') # For debugging
+            except Exception:
+                logger.exception('Resending the verification email for tracked email %s failed', tracked_email.pk)
                 Notification.objects.create(user=request.user, message='An error occurred while trying to resend the verification email.')
 
             return redirect('email_registration')
 
     # This is now for GET requests only
-    tracked_emails = TrackedEmail.objects.filter(user=request.user)
-    form = TrackedEmailForm()
-
-    # Determine if primary email is currently tracked
-    is_primary_email_tracked = TrackedEmail.objects.filter(user=request.user, email=request.user.email).exists()
-    
     context = {
-        'tracked_emails': tracked_emails,
+        'tracked_emails': snapshot['tracked_emails'],
         'non_primary_tracked_emails_count': non_primary_tracked_emails_count, # Pass this to template
-        'form': form,
+        'form': TrackedEmailForm(),
         'segment': 'email-registration',
-        'is_primary_email_tracked': is_primary_email_tracked, # Pass this to template
+        'is_primary_email_tracked': snapshot['primary'] is not None, # Pass this to template
+        'tracked_email_limit': settings.TRACKED_EMAIL_LIMIT,
     }
     return render(request, 'accounts/email-registration.html', context)
 
 
+@login_required(login_url="/login/")
+@require_POST
+def bulk_tracked_emails_view(request):
+    """
+    Add many tracked emails at once. Accepts a JSON body, a CSV body or an
+    uploaded `file`, and returns a per-row report as JSON.
+    """
+    if 'file' in request.FILES:
+        upload = request.FILES['file']
+        content, content_type = upload.read(), upload.content_type or ''
+    else:
+        content, content_type = request.body, request.content_type
+
+    try:
+        rows = parse_rows(content, content_type)
+        report = bulk_add_tracked_emails(
+            request.user,
+            rows,
+            lambda token: request.build_absolute_uri(reverse('verify_tracked_email', kwargs={'token': token})),
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'message': str(e)}, status=400)
+
+    if report['created']:
+        Notification.objects.create(user=request.user, message=f"{report['created']} email address(es) added. Verification emails have been sent.")
+    return JsonResponse(report, status=200)
+
+
 def verify_tracked_email(request, token):
     """
     View to handle email verification for tracked emails.
     """
-    tracked_email = get_object_or_404(TrackedEmail, verification_token=token)
-
-    if tracked_email.is_verified:
-        Notification.objects.create(user=tracked_email.user, message=f'The email address {tracked_email.email} is already verified.')
-    else:
-        tracked_email.is_verified = True
-        tracked_email.verification_token = None  # Clear the token after use
-        tracked_email.save()
-        Notification.objects.create(user=tracked_email.user, message=f'Your email address {tracked_email.email} has been successfully verified for tracking!')
+    # Links are single-use: a verified address no longer matches any token
+    tracked_email = tracked_email_for_token(token)
+    if tracked_email is None:
+        raise Http404('Invalid or expired verification link.')
+
+    tracked_email.is_verified = True
+    tracked_email.verification_token = None  # Clear the token after use
+    tracked_email.token_expires_at = None
+    tracked_email.save(update_fields=['is_verified', *TOKEN_FIELDS])
+    Notification.objects.create(user=tracked_email.user, message=f'Your email address {tracked_email.email} has been successfully verified for tracking!')
 
     return redirect('email_registration')
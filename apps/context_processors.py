@@ -4,3 +4,14 @@ def cfg_assets_root(request):
 
     return { 'ASSETS_ROOT' : settings.ASSETS_ROOT }
 
+
+def trial(request):
+    # Lazy, so pages that never show the trial don't force the user lookup
+    from django.utils.functional import SimpleLazyObject
+    from apps.authentication.trials import trial_status
+
+    def status():
+        user = getattr(request, 'user', None)
+        return trial_status(user) if user is not None and user.is_authenticated else {}
+
+    return { 'trial' : SimpleLazyObject(status) }
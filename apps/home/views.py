@@ -32,7 +32,7 @@ def pages(request):
         # it might be better to remove this block from here. Assuming profile view is primary.
         if 'avatar' in request.FILES:
             request.user.avatar = request.FILES['avatar']
-            request.user.save()
+            request.user.save(update_fields=['avatar'])
             return HttpResponseRedirect(request.path)
     
     # Add bio to context
@@ -1,10 +1,15 @@
 from django.contrib import admin
 
+from apps.utils.changelists import LargeTableAdmin, UsernameFilter
+
 from .models import Notification
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     list_display = ('user', 'message', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_select_related = ('user',)
+    list_filter = (UsernameFilter, 'is_read', 'created_at')
+    autocomplete_fields = ('user',)
+    # message has a trigram index on PostgreSQL (migration 0002)
     search_fields = ('user__username', 'message')
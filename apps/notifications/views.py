@@ -5,33 +5,34 @@ from django.views.decorators.http import require_POST
 from .models import Notification
 
 
+# The two read views are polled by every open page, so they are async: under
+# ASGI they don't tie up a worker thread while waiting on the database.
+
 @login_required
-def notification_count_view(request):
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
+async def notification_count_view(request):
+    user = await request.auser()
+    count = await Notification.objects.filter(user=user, is_read=False).acount()
     return JsonResponse({'count': count})
 
 
 @login_required
-def notification_list_view(request):
-    notifications = Notification.objects.filter(user=request.user, is_read=False)
+async def notification_list_view(request):
+    user = await request.auser()
+    notifications = Notification.objects.filter(user=user, is_read=False)
     data = [{
         'id': n.id,
         'message': n.message,
         'created_at': n.created_at.strftime('%b %d, %Y, %I:%M %p')
-    } for n in notifications]
+    } async for n in notifications]
     return JsonResponse({'notifications': data})
 
 
 @login_required
 @require_POST
 def mark_notification_as_read_view(request, notification_id):
-    try:
-        notification = Notification.objects.get(id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
-        return JsonResponse({'status': 'success'})
-    except Notification.DoesNotExist:
+    if not Notification.objects.filter(id=notification_id, user=request.user).update(is_read=True):
         return JsonResponse({'status': 'error', 'message': 'Notification not found'}, status=404)
+    return JsonResponse({'status': 'success'})
 
 
 @login_required
@@ -0,0 +1,49 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.authentication.models import CustomUser
+from apps.utils.tests import TempMediaRootMixin
+
+
+@override_settings(QRCODE_PERSIST=True)
+class PersistedVCardQRTests(TempMediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user('kate', 'kate@example.com', 'kate-password')
+        self.client.force_login(self.user)
+        self.url = reverse('generate_vcard_qr_image', args=[self.user.pk])
+        self.directory = f'qrcodes/{self.user.pk}'
+
+    def stored_images(self):
+        return default_storage.listdir(self.directory)[1]
+
+    def test_image_is_persisted_and_served_from_storage(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(len(self.stored_images()), 1)
+
+        second = self.client.get(self.url)
+        self.assertEqual(b''.join(second.streaming_content), first.content)
+        self.assertEqual(len(self.stored_images()), 1)
+
+    def test_changed_vcard_replaces_the_stale_image(self):
+        self.client.get(self.url)
+        before = self.stored_images()
+
+        CustomUser.objects.filter(pk=self.user.pk).update(website='https://example.com')
+        self.client.get(self.url)
+        after = self.stored_images()
+        self.assertEqual(len(after), 1)
+        self.assertNotEqual(after, before)
+
+    @override_settings(QRCODE_PERSIST=False)
+    def test_nothing_is_written_when_disabled(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertFalse(default_storage.exists(self.directory))
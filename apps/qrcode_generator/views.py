@@ -1,9 +1,12 @@
 from django.shortcuts import render
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import qrcode
+from django.conf import settings
+from django.core.files.storage import default_storage
+import hashlib
 from io import BytesIO
 from apps.authentication.models import CustomUser
+from apps.utils.storage import delete_directory, save_stream, serve_file
 from django.utils.html import strip_tags
 
 
@@ -13,6 +16,8 @@ def generate_qr(request):
     if not data:
         return HttpResponse('Missing data parameter', status=400)
     
+    import qrcode  # pulls in PIL; imported on first use to keep worker startup light
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -42,24 +47,14 @@ def vcard_qr_page(request):
             request.user.vcard_include_email = request.POST.get('vcard_include_email') == 'on'
             request.user.vcard_include_website = request.POST.get('vcard_include_website') == 'on'
             request.user.vcard_include_bio = request.POST.get('vcard_include_bio') == 'on'
-            request.user.save()
+            request.user.save(update_fields=['vcard_include_name', 'vcard_include_email',
+                                             'vcard_include_website', 'vcard_include_bio'])
             from django.shortcuts import redirect
             return redirect('vcard_qr_page')
     
+    # Trial information comes from the `trial` context processor
     context = {'current_user': request.user}
-    
-    # Add trial information if user is authenticated
-    if request.user.is_authenticated:
-        # Calculate days left on trial
-        from datetime import timedelta
-        from django.utils import timezone
-        
-        TRIAL_DURATION_DAYS = 3
-        today = timezone.now().date()
-        days_since_registration = (today - request.user.date_joined.date()).days
-        days_left = max(0, TRIAL_DURATION_DAYS - days_since_registration)
-        context['days_left_on_trial'] = days_left
-    
+
     return render(request, 'qrcode_generator/vcard-qr.html', context)
 
 def generate_vcard_qr_image(request, user_id):
@@ -96,6 +91,14 @@ def generate_vcard_qr_image(request, user_id):
     
     vcard_data += "END:VCARD"
 
+    # The image only changes when the vCard content does, so persisted images are
+    # keyed by a hash of it and served straight from storage on later requests.
+    image_name = f"qrcodes/{user.pk}/{hashlib.sha256(vcard_data.encode('utf-8')).hexdigest()[:32]}.png"
+    if settings.QRCODE_PERSIST and default_storage.exists(image_name):
+        return serve_file(image_name, 'image/png')
+
+    import qrcode
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -111,4 +114,13 @@ def generate_vcard_qr_image(request, user_id):
     img.save(buffer, format='PNG')
     buffer.seek(0)
 
+    if settings.QRCODE_PERSIST:
+        _remove_stale_vcard_images(user.pk)
+        save_stream(image_name, buffer)
+
     return HttpResponse(buffer.getvalue(), content_type='image/png')
+
+
+def _remove_stale_vcard_images(user_id):
+    """Drop images persisted for an older version of the user's vCard."""
+    delete_directory(f"qrcodes/{user_id}")
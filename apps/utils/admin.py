@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import MaintenanceRun
+
+
+@admin.register(MaintenanceRun)
+class MaintenanceRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'started_at', 'duration', 'rows', 'error')
+    list_filter = ('job',)
@@ -10,6 +10,13 @@ class UtilsConfig(AppConfig):
     def ready(self):
         # Import signals to register them
         from . import signals
+        from django.db.backends.signals import connection_created
+        from .db import on_connection_created
+        connection_created.connect(on_connection_created, dispatch_uid='apps.utils.db.on_connection_created')
+        if settings.METRICS_ENABLED:
+            from . import instrumentation, metrics
+            instrumentation.install_mail()
+            connection_created.connect(metrics.on_connection_created, dispatch_uid='apps.utils.metrics.on_connection_created')
 
 @receiver(post_migrate)
 def create_superuser(sender, **kwargs):
@@ -0,0 +1,49 @@
+"""
+Process-wide database connection counters.
+
+`connection_created` fires whenever Django opens a connection (or checks one
+out of the psycopg pool). Comparing that with the number of requests served
+shows how well persistent connections / pooling are being reused.
+"""
+import threading
+
+from asgiref.local import Local
+
+_lock = threading.Lock()
+_local = Local()
+
+_stats = {
+    'requests': 0,
+    'requests_opening_connection': 0,
+    'connections_opened': 0,
+}
+
+
+def on_connection_created(sender, connection, **kwargs):
+    with _lock:
+        _stats['connections_opened'] += 1
+    _local.opened = getattr(_local, 'opened', 0) + 1
+
+
+def start_request():
+    _local.opened = 0
+
+
+def finish_request():
+    """Record the current request and return how many connections it opened."""
+    opened = getattr(_local, 'opened', 0)
+    with _lock:
+        _stats['requests'] += 1
+        if opened:
+            _stats['requests_opening_connection'] += 1
+    return opened
+
+
+def connection_stats():
+    with _lock:
+        stats = dict(_stats)
+    requests = stats['requests']
+    stats['connection_reuse_ratio'] = (
+        round(1 - stats['requests_opening_connection'] / requests, 4) if requests else None
+    )
+    return stats
@@ -0,0 +1,206 @@
+"""
+Per-request timing breakdown recorded by RequestMetricsMiddleware.
+
+While a recorded request runs, its database queries, template renders, cache
+reads, outbound HTTP calls and sent mail are added to a request-local record.
+Queries are timed by a `connection.execute_wrapper` that the middleware adds
+for the length of the request (hook_queries). The other hooks are patched in
+by install() the first time a request is recorded, and from then on cost a
+local lookup for requests that aren't. asgiref's Local follows a request from
+an async view into the threads its ORM calls run in, so async views are
+recorded too.
+"""
+import contextlib
+import functools
+import time
+
+from asgiref.local import Local
+from django.conf import settings
+
+_local = Local()
+_installed = False
+_mail_installed = False
+_MISS = object()
+
+
+def start(capture_sql=False):
+    """Begin recording; with `capture_sql`, record['statements'] also lists every (sql, ms)."""
+    _local.record = {
+        'db_queries': 0, 'db_ms': 0.0,
+        'template_ms': 0.0,
+        'cache_hits': 0, 'cache_misses': 0, 'cache_ms': 0.0,
+        'http_calls': 0, 'http_ms': 0.0,
+        'mail_messages': 0, 'mail_ms': 0.0,
+    }
+    if capture_sql:
+        _local.record['statements'] = []
+    return _local.record
+
+
+def finish():
+    record = current()
+    _local.record = None
+    return record
+
+
+def current():
+    return getattr(_local, 'record', None)
+
+
+def _timed(func, prefix, counter=None):
+    """Wrap `func` so calls made during a recorded request add to `<prefix>_ms` and `counter`."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        record = current()
+        if record is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record[f'{prefix}_ms'] += (time.perf_counter() - start) * 1000
+            if counter:
+                record[counter] += 1
+    return wrapper
+
+
+def _atimed(func, prefix, counter):
+    """_timed for coroutine functions."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        record = current()
+        if record is None:
+            return await func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            record[f'{prefix}_ms'] += (time.perf_counter() - start) * 1000
+            record[counter] += 1
+    return wrapper
+
+
+def record_query(execute, sql, params, many, context):
+    """An execute_wrapper adding each query to the current record, if any."""
+    record = current()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        record['db_ms'] += elapsed
+        record['db_queries'] += 1
+        if 'statements' in record:
+            record['statements'].append((sql, elapsed))
+
+
+def hook_queries():
+    """
+    Add record_query to this thread's database connections and return an
+    ExitStack that removes it again. Connections are per thread, so under
+    ASGI this has to run on the thread the ORM calls run in.
+    """
+    from django.db import connections
+
+    stack = contextlib.ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(record_query))
+    return stack
+
+
+def _counting_cache_get(get):
+    @functools.wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        record = current()
+        if record is None:
+            return get(self, key, default, version)
+        start = time.perf_counter()
+        value = get(self, key, _MISS, version)
+        record['cache_ms'] += (time.perf_counter() - start) * 1000
+        if value is _MISS:
+            record['cache_misses'] += 1
+            return default
+        record['cache_hits'] += 1
+        return value
+    return wrapper
+
+
+def install():
+    """Patch the non-database hooks in place. Safe to call more than once."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.core.cache import caches
+    from django.template.backends.django import Template
+
+    Template.render = _timed(Template.render, 'template')
+
+    for backend in {type(caches[alias]) for alias in settings.CACHES}:
+        backend.get = _counting_cache_get(backend.get)
+
+    import httpx
+    import requests
+    requests.Session.send = _timed(requests.Session.send, 'http', 'http_calls')
+    httpx.AsyncClient.send = _atimed(httpx.AsyncClient.send, 'http', 'http_calls')
+
+    install_mail()
+
+
+def _timed_send(send_messages):
+    """
+    Time the mail backend for the current record, if any, and with
+    METRICS_ENABLED for Prometheus too, inside requests or not.
+    """
+    @functools.wraps(send_messages)
+    def wrapper(self, email_messages):
+        messages = list(email_messages)
+        record = current()
+        start = time.perf_counter()
+        failed = 0
+        try:
+            sent = send_messages(self, messages)
+        except Exception:
+            failed = len(messages)
+            raise
+        else:
+            # fail_silently backends report failures as a short count instead of raising
+            if isinstance(sent, int) and sent < len(messages):
+                failed = len(messages) - sent
+            return sent
+        finally:
+            elapsed = time.perf_counter() - start
+            if record is not None:
+                record['mail_ms'] += elapsed * 1000
+                record['mail_messages'] += len(messages)
+            if settings.METRICS_ENABLED:
+                from apps.utils import metrics
+                metrics.observe_mail(elapsed, failed)
+    return wrapper
+
+
+def install_mail():
+    """Wrap the configured mail backend once; also called at startup with METRICS_ENABLED."""
+    global _mail_installed
+    if _mail_installed or not settings.EMAIL_BACKEND:
+        return
+    _mail_installed = True
+
+    from django.utils.module_loading import import_string
+    backend = import_string(settings.EMAIL_BACKEND)
+    backend.send_messages = _timed_send(backend.send_messages)
+
+
+def server_timing(record, total_ms):
+    """The record as a `Server-Timing` header value."""
+    return ', '.join([
+        f'db;dur={record["db_ms"]:.1f};desc="{record["db_queries"]} queries"',
+        f'tpl;dur={record["template_ms"]:.1f}',
+        f'cache;dur={record["cache_ms"]:.1f};desc="{record["cache_hits"]} hit {record["cache_misses"]} miss"',
+        f'http;dur={record["http_ms"]:.1f};desc="{record["http_calls"]} calls"',
+        f'mail;dur={record["mail_ms"]:.1f};desc="{record["mail_messages"]} messages"',
+        f'total;dur={total_ms:.1f}',
+    ])
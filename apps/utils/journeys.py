@@ -0,0 +1,105 @@
+"""
+Scripted user journeys for `manage.py loadtest --journeys`.
+
+Every virtual user signs up a fresh `loadtest-*` account and walks through the
+app the way a new user does: register, follow the confirmation mail, log in,
+open the profile, poll notifications, open the vCard page and its QR image,
+and add a tracked email. Each request is timed under its step name so the
+report has percentiles per endpoint. Mail is read from a StubSMTPServer.
+"""
+import re
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+from django.urls import reverse
+
+from apps.utils.smtpstub import message_text
+
+USERNAME_PREFIX = 'loadtest-'
+
+CONFIRM_LINK = re.compile(r'https?://\S+?/accounts/confirm-email/[^/\s]+/')
+TRACKED_EMAIL_LINK = re.compile(r'https?://\S+?/verify-email/[^/\s]+/')
+VCARD_IMAGE = re.compile(r'/qrcode/vcard-image/\d+/')
+
+STEPS = [
+    'register', 'confirm_email', 'login', 'profile', 'notifications:count',
+    'vcard_qr_page', 'vcard_image', 'add_tracked_email', 'verify_tracked_email',
+]
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class Journey:
+    """
+    One pass through the app as a new user. `record(step, ms)` is called for
+    every request, with `ms=None` when it failed.
+    """
+
+    def __init__(self, base_url, inbox, record, polls=3, mail_timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.inbox = inbox
+        self.record = record
+        self.polls = polls
+        self.mail_timeout = mail_timeout
+        self.session = requests.Session()
+
+    def request(self, step, method, path, expect=(200, 302), **kwargs):
+        # Links in mails carry the server's idea of its own host; always use ours
+        url = self.base_url + (urlsplit(path).path if path.startswith('http') else path)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=30, allow_redirects=False, **kwargs)
+        except requests.RequestException as e:
+            self.record(step, None)
+            raise JourneyFailed(f'{step}: {e}')
+        if response.status_code not in expect:
+            self.record(step, None)
+            raise JourneyFailed(f'{step}: HTTP {response.status_code}')
+        self.record(step, (time.perf_counter() - start) * 1000)
+        return response
+
+    def post(self, step, path, data, **kwargs):
+        data = dict(data, csrfmiddlewaretoken=self.session.cookies.get('csrftoken', ''))
+        return self.request(step, 'POST', path, data=data, headers={'Referer': self.base_url + path}, **kwargs)
+
+    def link_from_mail(self, step, recipient, pattern):
+        message = self.inbox.wait_for(recipient, self.mail_timeout)
+        match = pattern.search(message_text(message)) if message else None
+        if not match:
+            self.record(step, None)
+            raise JourneyFailed(f'{step}: no mail with a link for {recipient}')
+        return match.group(0)
+
+    def run(self):
+        username = USERNAME_PREFIX + uuid.uuid4().hex[:12]
+        email = f'{username}@example.com'
+        password = uuid.uuid4().hex + 'Aa1!'
+
+        # GETs that only fetch a CSRF cookie aren't timed
+        self.session.get(self.base_url + reverse('register'), timeout=30)
+        self.post('register', reverse('register'), {
+            'username': username, 'email': email, 'password1': password, 'password2': password,
+        }, expect=(200,))
+        self.request('confirm_email', 'GET', self.link_from_mail('confirm_email', email, CONFIRM_LINK))
+
+        self.session.cookies.clear()
+        self.session.get(self.base_url + reverse('login'), timeout=30)
+        self.post('login', reverse('login'), {'username': username, 'password': password}, expect=(302,))
+
+        self.request('profile', 'GET', reverse('profile'), expect=(200,))
+        for _ in range(self.polls):
+            self.request('notifications:count', 'GET', reverse('notifications:count'), expect=(200,))
+
+        page = self.request('vcard_qr_page', 'GET', reverse('vcard_qr_page'), expect=(200,))
+        image = VCARD_IMAGE.search(page.text)
+        if image:
+            self.request('vcard_image', 'GET', image.group(0), expect=(200, 302))
+
+        tracked = f'{username}-tracked@example.com'
+        self.post('add_tracked_email', reverse('email_registration'), {'action': 'add_email', 'email': tracked})
+        self.request('verify_tracked_email', 'GET',
+                     self.link_from_mail('verify_tracked_email', tracked, TRACKED_EMAIL_LINK))
@@ -0,0 +1,82 @@
+"""
+Periodic database cleanup jobs, run by the `run_maintenance` management command.
+
+Every job deletes (or clears) in batches of `batch_size` rows so no single
+statement holds locks on a large table for long, and returns the number of
+rows it touched.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+
+def delete_in_batches(queryset, batch_size):
+    model = queryset.model
+    removed = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return removed
+        model._base_manager.filter(pk__in=pks).delete()
+        removed += len(pks)
+
+
+def clear_expired_sessions(batch_size):
+    # Only the database-backed engines keep rows; cache sessions expire on their own.
+    if settings.SESSION_ENGINE not in ('django.contrib.sessions.backends.db',
+                                       'django.contrib.sessions.backends.cached_db'):
+        return 0
+    from django.contrib.sessions.models import Session
+    return delete_in_batches(Session.objects.filter(expire_date__lt=timezone.now()), batch_size)
+
+
+def delete_expired_email_confirmations(batch_size):
+    from allauth.account.models import EmailConfirmation
+    return delete_in_batches(EmailConfirmation.objects.all_expired(), batch_size)
+
+
+def clear_stale_verification_tokens(batch_size):
+    """Clear tokens of verified tracked emails and of links that have expired."""
+    from django.db.models import Q
+    from apps.authentication.models import TrackedEmail
+    queryset = TrackedEmail.objects.filter(
+        Q(is_verified=True) | Q(token_expires_at__lt=timezone.now()),
+        verification_token__isnull=False,
+    )
+    cleared = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return cleared
+        cleared += TrackedEmail.objects.filter(pk__in=pks).update(verification_token=None, token_expires_at=None)
+
+
+def purge_requested_accounts(batch_size):
+    from apps.authentication.deletion import purge_requested_accounts
+    return purge_requested_accounts(batch_size)
+
+
+def send_trial_reminders(batch_size):
+    """Remind users whose trial ends within the next day (see the send_trial_reminders command)."""
+    from datetime import timedelta
+    from apps.authentication.trials import send_trial_reminders
+    now = timezone.now()
+    return send_trial_reminders(now, now + timedelta(days=1), chunk_size=batch_size)['users']
+
+
+def prune_maintenance_runs(batch_size):
+    """Drop MaintenanceRun history older than MAINTENANCE_RUN_RETENTION_DAYS."""
+    from datetime import timedelta
+    from apps.utils.models import MaintenanceRun
+    cutoff = timezone.now() - timedelta(days=settings.MAINTENANCE_RUN_RETENTION_DAYS)
+    return delete_in_batches(MaintenanceRun.objects.filter(started_at__lt=cutoff), batch_size)
+
+
+# (job name, interval in seconds, function)
+SCHEDULE = [
+    ('clear_expired_sessions', 60 * 60, clear_expired_sessions),
+    ('delete_expired_email_confirmations', 6 * 60 * 60, delete_expired_email_confirmations),
+    ('clear_stale_verification_tokens', 6 * 60 * 60, clear_stale_verification_tokens),
+    ('purge_requested_accounts', 60, purge_requested_accounts),
+    ('send_trial_reminders', 60 * 60, send_trial_reminders),
+    ('prune_maintenance_runs', 24 * 60 * 60, prune_maintenance_runs),
+]
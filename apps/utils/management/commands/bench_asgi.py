@@ -0,0 +1,167 @@
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from io import BytesIO
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from apps.authentication.deletion import purge_user
+from apps.utils.management.commands.loadtest import Command as LoadTestCommand
+
+USERNAME = 'bench-asgi'
+
+
+def upstream_server(port, latency):
+    """A stand-in for Gravatar that answers every request with a small PNG after `latency` seconds."""
+    from PIL import Image
+
+    image = BytesIO()
+    Image.new('RGB', (80, 80), 'teal').save(image, format='PNG')
+    body = image.getvalue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Command(LoadTestCommand):
+    help = ('Compare how many concurrent I/O-bound requests one worker can carry under the sync WSGI '
+            'deployment and under ASGI (uvicorn) with the async views. Every request is a "Use Gravatar" '
+            'against a local upstream that takes --upstream-latency ms, mixed with notification polls.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='sync,gthread,uvicorn',
+                            help='Comma-separated gunicorn worker modes to compare.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Workers per deployment; capacity is reported per worker.')
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help='Number of concurrent clients.')
+        parser.add_argument('--duration', type=float, default=15,
+                            help='Seconds to run each deployment for.')
+        parser.add_argument('--upstream-latency', type=float, default=250,
+                            help='Milliseconds the stub Gravatar takes to answer.')
+        parser.add_argument('--port', type=int, default=5105,
+                            help='Port gunicorn binds to.')
+        parser.add_argument('--upstream-port', type=int, default=5106,
+                            help='Port of the stub Gravatar.')
+
+    def handle(self, *args, **options):
+        # Every "Use Gravatar" stores an avatar; keep them out of the real MEDIA_ROOT (or bucket)
+        # and drop them all with the directory, whatever the workers left behind
+        with tempfile.TemporaryDirectory(prefix='bench-asgi-media-') as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            self.bench(media_root, options)
+
+    def bench(self, media_root, options):
+        upstream = upstream_server(options['upstream_port'], options['upstream_latency'] / 1000)
+        user, cookies = self.bench_session()
+        environ = {
+            # The session is signed with ours; without a SECRET_KEY each process makes one up
+            'SECRET_KEY': settings.SECRET_KEY,
+            'WEB_CONCURRENCY': str(options['workers']),
+            'GRAVATAR_URL': f"http://127.0.0.1:{options['upstream_port']}/avatar/",
+            'STORAGE_BACKEND': 'local',
+            'MEDIA_ROOT': media_root,
+        }
+
+        summary = []
+        try:
+            for mode in options['modes'].split(','):
+                base_url = f"http://127.0.0.1:{options['port']}"
+                server = self.start_gunicorn(mode, options['port'], environ=environ)
+                try:
+                    results = self.run_mixed(base_url, cookies, options['concurrency'], options['duration'])
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\nWorker mode: {mode}'))
+                throughput, p95 = self.report(base_url, results, options['duration'])
+                # Little's law: Gravatar calls completed per second x time each spends upstream
+                # = how many of them a worker keeps waiting on the upstream at once
+                gravatars = len(results['use_gravatar']['latencies']) / options['duration']
+                in_flight = gravatars * options['upstream_latency'] / 1000 / options['workers']
+                summary.append((mode, throughput, p95, in_flight))
+        finally:
+            upstream.shutdown()
+            purge_user(get_user_model().objects.get(pk=user.pk), batch_size=1000)
+            import_module(settings.SESSION_ENGINE).SessionStore(cookies[settings.SESSION_COOKIE_NAME]).delete()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nSummary'))
+        self.stdout.write(f"{'mode':<10} {'req/s':>8} {'p95 ms':>9} {'upstream waits/worker':>22}")
+        for mode, throughput, p95, in_flight in summary:
+            self.stdout.write(f'{mode:<10} {throughput:8.1f} {p95:9.1f} {in_flight:22.1f}')
+
+    def bench_session(self):
+        """A throwaway user with an email (so Gravatar applies), a session and a CSRF cookie."""
+        User = get_user_model()
+        User.objects.filter(username=USERNAME).delete()
+        user = User.objects.create_user(USERNAME, f'{USERNAME}@example.com', get_random_string(32))
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+
+        return user, {settings.SESSION_COOKIE_NAME: session.session_key,
+                      settings.CSRF_COOKIE_NAME: get_random_string(32)}
+
+    def run_mixed(self, base_url, cookies, concurrency, duration):
+        # A redirect to the login page would also be a 302, so check where it goes
+        requests_by_step = [
+            ('use_gravatar', 'POST', reverse('use_gravatar'), (302, reverse('profile'))),
+            ('notifications:count', 'GET', reverse('notifications:count'), (200, None)),
+        ]
+        results = {step: {'latencies': [], 'errors': 0} for step, *_ in requests_by_step}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            session = requests.Session()
+            session.cookies.update(cookies)
+            session.headers['X-CSRFToken'] = cookies[settings.CSRF_COOKIE_NAME]
+            i = offset
+            while time.monotonic() < deadline:
+                step, method, path, expect = requests_by_step[i % len(requests_by_step)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = session.request(method, base_url + path, timeout=60, allow_redirects=False)
+                    ok = (response.status_code, response.headers.get('Location')) == expect
+                except requests.RequestException:
+                    ok = False
+                elapsed = (time.perf_counter() - start) * 1000
+                if time.monotonic() > deadline:
+                    break  # finished after the window; counting it would inflate req/s
+                with lock:
+                    if ok:
+                        results[step]['latencies'].append(elapsed)
+                    else:
+                        results[step]['errors'] += 1
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
@@ -0,0 +1,74 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a fresh gunicorn worker does before its first response: set Django up
+# and import every view through the URLconf.
+WORKER_BOOT = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+# Packages our own code only imports when a request needs them. (`requests`
+# isn't listed: allauth's OAuth provider views import it during URL loading.)
+LAZY_PACKAGES = ['PIL', 'qrcode', 'boto3', 'storages', 'httpx']
+
+
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us)} from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Profile cold-start imports (python -X importtime) of a gunicorn worker or a manage.py command.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--command', default=None,
+                            help='Profile `manage.py <command>` (e.g. "check") instead of a worker boot.')
+        parser.add_argument('--repeat', type=int, default=5, help='Cold starts to time; the median is reported.')
+        parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list.')
+
+    def handle(self, *args, **options):
+        if options['command']:
+            argv = [sys.executable, '-X', 'importtime', 'manage.py', *options['command'].split()]
+        else:
+            argv = [sys.executable, '-X', 'importtime', '-c', WORKER_BOOT]
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+        wall = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            result = subprocess.run(argv, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            wall.append((time.perf_counter() - start) * 1000)
+            if result.returncode:
+                raise CommandError(result.stderr[-2000:])
+        modules = parse_importtime(result.stderr)
+
+        self.stdout.write(f"Profiled: {' '.join(argv[3:])}")
+        self.stdout.write(f'Wall time (median of {len(wall)}): {statistics.median(wall):.0f} ms')
+        self.stdout.write(f'Modules imported: {len(modules)}, '
+                          f'total import time: {sum(s for s, _ in modules.values()) / 1000:.0f} ms')
+
+        # Top-level packages only, so nested imports aren't counted twice
+        top_level = {name: cumulative for name, (_, cumulative) in modules.items() if '.' not in name}
+        self.stdout.write(f"\n{'package':<30} {'cumulative ms':>14}")
+        for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{name:<30} {cumulative / 1000:>14.1f}')
+
+        eager = [name for name in LAZY_PACKAGES if name in modules]
+        if eager:
+            self.stdout.write(self.style.WARNING(f"\nImported at startup but expected lazily: {', '.join(eager)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"\nNone of {', '.join(LAZY_PACKAGES)} imported at startup."))
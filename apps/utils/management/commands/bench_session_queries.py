@@ -0,0 +1,43 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+SESSION_ENGINES = ['db', 'cached_db', 'cache']
+
+
+class Command(BaseCommand):
+    help = 'Measure database queries per authenticated request for each session engine (runs on a throwaway test database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per session engine.')
+        parser.add_argument('--path', default=None, help='Path to request. Defaults to the notifications count poll.')
+
+    def handle(self, *args, **options):
+        from django.contrib.auth import get_user_model
+
+        path = options['path'] or reverse('notifications:count')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            user = get_user_model().objects.create_user('bench', 'bench@example.com', 'bench-password')
+
+            self.stdout.write(f'GET {path} x {options["requests"]}')
+            self.stdout.write(f"{'session engine':<16} {'queries/request':>16}")
+            for engine in SESSION_ENGINES:
+                with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                    cache.clear()
+                    client = Client()
+                    client.force_login(user)
+                    client.get(path)  # warm up: first read fills the cache
+
+                    with CaptureQueriesContext(connection) as queries:
+                        for _ in range(options['requests']):
+                            client.get(path)
+                self.stdout.write(f"{engine:<16} {len(queries) / options['requests']:>16.2f}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
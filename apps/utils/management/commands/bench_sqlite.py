@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# What a connection gets without any tuning: rollback journal, full fsync,
+# and Python's default 5 second busy timeout.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+}
+
+
+def write_worker(path, pragmas, transaction_mode, deadline, queue):
+    """Insert notification-sized rows one transaction at a time, like Notification.objects.create."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name}={value}')
+
+    written = failed = 0
+    while time.time() < deadline:
+        try:
+            conn.execute(f'BEGIN {transaction_mode}')
+            conn.execute(
+                'INSERT INTO notification (user_id, message, is_read, created_at) VALUES (?, ?, 0, ?)',
+                (os.getpid() % 100, 'Email address added. A verification email has been sent.', time.time()),
+            )
+            conn.execute('COMMIT')
+            written += 1
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            failed += 1
+    conn.close()
+    queue.put((written, failed))
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent SQLite write throughput with default and configured (SQLITE_PRAGMAS) settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of writer processes.')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds to write for in each run.')
+
+    def handle(self, *args, **options):
+        runs = [
+            ('default', DEFAULT_PRAGMAS, 'DEFERRED'),
+            ('tuned', settings.SQLITE_PRAGMAS, settings.SQLITE_TRANSACTION_MODE),
+        ]
+        self.stdout.write(f"{'config':<10} {'rows':>8} {'rows/s':>10} {'failed':>8}")
+        for label, pragmas, transaction_mode in runs:
+            written, failed = self.run(pragmas, transaction_mode, options['workers'], options['duration'])
+            self.stdout.write(f"{label:<10} {written:>8} {written / options['duration']:>10.1f} {failed:>8}")
+
+    def run(self, pragmas, transaction_mode, workers, duration):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.sqlite3')
+            conn = sqlite3.connect(path)
+            conn.execute(
+                'CREATE TABLE notification (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, '
+                'message TEXT, is_read BOOL, created_at REAL)'
+            )
+            conn.execute('CREATE INDEX notification_user ON notification (user_id)')
+            conn.close()
+
+            queue = multiprocessing.Queue()
+            deadline = time.time() + duration
+            processes = [
+                multiprocessing.Process(target=write_worker, args=(path, pragmas, transaction_mode, deadline, queue))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            results = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+        return sum(r[0] for r in results), sum(r[1] for r in results)
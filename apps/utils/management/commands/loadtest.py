@@ -0,0 +1,213 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from apps.utils.journeys import STEPS, USERNAME_PREFIX, Journey, JourneyFailed
+from apps.utils.smtpstub import StubSMTPServer
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = ('Load-test the real views against a running server, or compare gunicorn worker modes. '
+            'With --journeys, virtual users walk through signup to tracked emails (apps.utils.journeys) '
+            'and mail is caught by a stub SMTP server; a server started separately must send mail to it, e.g. '
+            'EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend AWS_SES_REGION_ENDPOINT=127.0.0.1 '
+            'EMAIL_PORT=1025 EMAIL_USE_TLS=False.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:5005',
+                            help='Base URL of the server under test.')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Number of concurrent clients.')
+        parser.add_argument('--duration', type=float, default=20,
+                            help='Seconds to run each test for.')
+        parser.add_argument('--paths', default=None,
+                            help='Comma-separated paths to request. Defaults to a mix of the public views.')
+        parser.add_argument('--compare', default=None,
+                            help='Comma-separated gunicorn worker modes (sync,gthread,uvicorn). '
+                                 'Starts gunicorn with gunicorn-cfg.py for each mode and tests it.')
+        parser.add_argument('--port', type=int, default=5105,
+                            help='Port gunicorn binds to in --compare mode.')
+        parser.add_argument('--journeys', action='store_true',
+                            help='Run full user journeys instead of requesting --paths.')
+        parser.add_argument('--smtp-port', type=int, default=1025,
+                            help='Port of the stub SMTP server used by --journeys.')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the loadtest-* users afterwards (same database as the server only).')
+
+    def handle(self, *args, **options):
+        paths = options['paths'].split(',') if options['paths'] else self.default_paths()
+
+        smtp = None
+        if options['journeys']:
+            smtp = StubSMTPServer(port=options['smtp_port']).start()
+            run = lambda base_url: self.run_journeys(base_url, smtp, options['concurrency'], options['duration'])
+        else:
+            run = lambda base_url: self.run(base_url, paths, options['concurrency'], options['duration'])
+
+        try:
+            self.run_all(run, options, smtp)
+        finally:
+            if smtp:
+                smtp.shutdown()
+            if options['cleanup']:
+                deleted, _ = get_user_model().objects.filter(username__startswith=USERNAME_PREFIX).delete()
+                self.stdout.write(f'Deleted {deleted} loadtest row(s).')
+
+    def run_all(self, run, options, smtp):
+        if not options['compare']:
+            self.report(options['url'], run(options['url']), options['duration'])
+            return
+
+        summary = []
+        for mode in options['compare'].split(','):
+            base_url = f"http://127.0.0.1:{options['port']}"
+            server = self.start_gunicorn(mode, options['port'], smtp)
+            try:
+                results = run(base_url)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\nWorker mode: {mode}'))
+            summary.append((mode, self.report(base_url, results, options['duration'])))
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nSummary'))
+        for mode, (throughput, p95) in summary:
+            self.stdout.write(f'{mode:<10} {throughput:8.1f} req/s   p95 {p95:7.1f} ms')
+
+    def default_paths(self):
+        return [
+            reverse('home'),
+            reverse('login'),
+            reverse('generate_qr') + '?data=https://kryptisk.net',
+            reverse('vcard_qr_page'),
+        ]
+
+    def start_gunicorn(self, mode, port, smtp=None, environ=None):
+        env = dict(os.environ, GUNICORN_WORKER_MODE=mode, GUNICORN_BIND=f'127.0.0.1:{port}',
+                   GUNICORN_LOGLEVEL='warning', **(environ or {}))
+        if smtp:
+            env.update(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                       AWS_SES_REGION_ENDPOINT='127.0.0.1', EMAIL_PORT=str(smtp.port), EMAIL_USE_TLS='False')
+        config = os.path.join(settings.BASE_DIR, 'gunicorn-cfg.py')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', config, '--access-logfile', '/dev/null'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited while starting in {mode} mode.')
+            try:
+                requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+                return server
+            except requests.RequestException:
+                time.sleep(0.5)
+        server.terminate()
+        raise CommandError(f'gunicorn did not start in {mode} mode within 30 seconds.')
+
+    def run(self, base_url, paths, concurrency, duration):
+        results = {path: {'latencies': [], 'errors': 0} for path in paths}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            session = requests.Session()
+            i = offset
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = session.get(base_url + path, timeout=30, allow_redirects=False)
+                    # A login-required view answers anonymous clients with a 302 to the login page
+                    ok = (response.status_code < 400
+                          and not response.headers.get('Location', '').startswith(settings.LOGIN_URL))
+                except requests.RequestException:
+                    ok = False
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if ok:
+                        results[path]['latencies'].append(elapsed)
+                    else:
+                        results[path]['errors'] += 1
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def run_journeys(self, base_url, smtp, concurrency, duration):
+        results = {step: {'latencies': [], 'errors': 0} for step in STEPS}
+        results['journey'] = {'latencies': [], 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+        failures = []
+
+        def record(step, elapsed):
+            with lock:
+                if elapsed is None:
+                    results[step]['errors'] += 1
+                else:
+                    results[step]['latencies'].append(elapsed)
+
+        def virtual_user():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    Journey(base_url, smtp, record).run()
+                except JourneyFailed as e:
+                    record('journey', None)
+                    with lock:
+                        failures.append(str(e))
+                else:
+                    record('journey', (time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=virtual_user) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for failure in sorted(set(failures))[:10]:
+            self.stderr.write(self.style.WARNING(f'Journey failed at {failure}'))
+        return results
+
+    def report(self, base_url, results, duration):
+        self.stdout.write(f'Target: {base_url}')
+        self.stdout.write(f"{'path':<45} {'reqs':>7} {'err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+        all_latencies = []
+        for path, result in results.items():
+            latencies = sorted(result['latencies'])
+            if path != 'journey':  # whole journeys aren't requests of their own
+                all_latencies.extend(latencies)
+            self.stdout.write(
+                f"{path[:45]:<45} {len(latencies):>7} {result['errors']:>5} "
+                f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f}"
+            )
+
+        all_latencies.sort()
+        throughput = len(all_latencies) / duration
+        self.stdout.write(self.style.SUCCESS(f'Throughput: {throughput:.1f} req/s'))
+        if 'journey' in results:
+            journeys = len(results['journey']['latencies'])
+            self.stdout.write(self.style.SUCCESS(f'Journeys: {journeys} completed ({journeys / duration:.2f}/s)'))
+        return throughput, percentile(all_latencies, 95)
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.utils.maintenance import SCHEDULE
+from apps.utils.models import MaintenanceRun
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic cleanup jobs in apps.utils.maintenance.SCHEDULE, forever or once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run every job (or --job) once and exit, e.g. from cron.')
+        parser.add_argument('--job', action='append', default=None,
+                            help='Only run this job. Can be given several times.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        jobs = SCHEDULE
+        if options['job']:
+            unknown = set(options['job']) - {name for name, _, _ in SCHEDULE}
+            if unknown:
+                raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}")
+            jobs = [job for job in SCHEDULE if job[0] in options['job']]
+
+        if options['once']:
+            for name, _, func in jobs:
+                self.run_job(name, func, options['batch_size'])
+            return
+
+        # Pick up where the last runner left off instead of running everything on restart
+        next_run = {}
+        for name, interval, _ in jobs:
+            last = MaintenanceRun.objects.filter(job=name).order_by('-started_at').first()
+            next_run[name] = last.started_at.timestamp() + interval if last else 0
+
+        self.stdout.write(f"Maintenance runner started with {len(jobs)} job(s).")
+        while True:
+            for name, interval, func in jobs:
+                if time.time() >= next_run[name]:
+                    self.run_job(name, func, options['batch_size'])
+                    next_run[name] = time.time() + interval
+            close_old_connections()
+            time.sleep(max(1, min(next_run.values()) - time.time()))
+
+    def run_job(self, name, func, batch_size):
+        started_at = timezone.now()
+        start = time.perf_counter()
+        rows, error = 0, ''
+        try:
+            rows = func(batch_size)
+        except Exception as e:
+            error = str(e)
+        duration = time.perf_counter() - start
+
+        MaintenanceRun.objects.create(job=name, started_at=started_at, duration=duration, rows=rows, error=error)
+        if error:
+            self.stderr.write(self.style.ERROR(f'{name}: failed after {duration:.2f}s: {error}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{name}: {rows} row(s) in {duration:.2f}s'))
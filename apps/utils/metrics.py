@@ -0,0 +1,66 @@
+"""
+Prometheus metrics, served at /metrics by apps.utils.views.metrics_view.
+
+Every gunicorn worker keeps its own counters. With PROMETHEUS_MULTIPROC_DIR set
+to an empty, writable directory, prometheus_client keeps them in per-process
+files instead, the view aggregates all of them, and gunicorn-cfg.py removes the
+files of workers that exit.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'django_request_duration_seconds', 'Request latency by URL name.',
+    ['view', 'method', 'status'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+DB_QUERIES = Counter('django_db_queries', 'SQL statements executed while serving requests.', ['view'])
+DB_QUERY_SECONDS = Counter('django_db_query_seconds', 'Time spent in SQL statements while serving requests.', ['view'])
+DB_CONNECTIONS_OPENED = Counter('django_db_connections_opened', 'Database connections opened.')
+CACHE_HITS = Counter('django_cache_hits', 'Cache reads that found a value.')
+CACHE_MISSES = Counter('django_cache_misses', 'Cache reads that found nothing.')
+EMAIL_SEND_LATENCY = Histogram('email_send_duration_seconds', 'Time to hand a batch of messages to the mail backend.')
+EMAIL_SEND_FAILURES = Counter('email_send_failures', 'Messages the mail backend failed to send.')
+AVATAR_PROCESSING = Histogram(
+    'avatar_processing_duration_seconds', 'Time to fetch, resize and store an avatar.', ['source'],
+)
+
+
+def observe_mail(seconds, failed):
+    """One send_messages() call, timed by apps.utils.instrumentation's mail hook."""
+    EMAIL_SEND_LATENCY.observe(seconds)
+    if failed:
+        EMAIL_SEND_FAILURES.inc(failed)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    DB_CONNECTIONS_OPENED.inc()
+
+
+def observe_request(view, method, status, seconds, record):
+    """Record one finished request; `record` comes from apps.utils.instrumentation."""
+    view = view or 'unmatched'
+    REQUEST_LATENCY.labels(view, method, status).observe(seconds)
+    if record['db_queries']:
+        DB_QUERIES.labels(view).inc(record['db_queries'])
+        DB_QUERY_SECONDS.labels(view).inc(record['db_ms'] / 1000)
+    if record['cache_hits']:
+        CACHE_HITS.inc(record['cache_hits'])
+    if record['cache_misses']:
+        CACHE_MISSES.inc(record['cache_misses'])
+
+
+def observe_avatar(source, seconds):
+    AVATAR_PROCESSING.labels(source).observe(seconds)
+
+
+def exposition():
+    """(body, content type) for a scrape, aggregated across workers in multi-process mode."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,164 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from apps.utils import db, instrumentation, queryinspector, routers
+
+logger = logging.getLogger(__name__)
+metrics_logger = logging.getLogger('apps.request_metrics')
+
+
+class WrappingMiddleware:
+    """
+    Base for middleware that runs code around the rest of the stack, in either
+    WSGI or ASGI mode. Under ASGI a sync-only middleware would park every
+    request on a thread for as long as an async view awaits.
+
+    Subclasses implement before(request), returning any state they need, and
+    after(request, response, state), returning the response. failed(state) is
+    called instead of after() if the rest of the stack raised. Under ASGI
+    abefore(request) is called instead of before(); it defaults to before().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.before(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.failed(state)
+            raise
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        state = await self.abefore(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self.failed(state)
+            raise
+        return self.after(request, response, state)
+
+    def before(self, request):
+        return None
+
+    async def abefore(self, request):
+        return self.before(request)
+
+    def after(self, request, response, state):
+        return response
+
+    def failed(self, state):
+        pass
+
+
+class DBConnectionMetricsMiddleware(WrappingMiddleware):
+    """Counts, per request, whether a new database connection had to be opened."""
+
+    def before(self, request):
+        db.start_request()
+
+    def after(self, request, response, state):
+        opened = db.finish_request()
+        if opened:
+            logger.debug('%s %s opened %d database connection(s)', request.method, request.path, opened)
+        return response
+
+
+class ReplicaPinningMiddleware(WrappingMiddleware):
+    """
+    Keeps a client on the primary database for a few seconds after it wrote
+    something, using a short-lived cookie (see apps.utils.routers).
+    """
+    cookie_name = 'db_pin'
+
+    def before(self, request):
+        routers.start_request(pinned=self.cookie_name in request.COOKIES)
+
+    def after(self, request, response, state):
+        if settings.DB_REPLICAS and routers.wrote_during_request():
+            response.set_cookie(self.cookie_name, '1', max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class RequestMetricsMiddleware(WrappingMiddleware):
+    """
+    Times requests broken down into database, templates, cache, outbound HTTP
+    and mail (apps.utils.instrumentation).
+
+    With METRICS_ENABLED every request feeds the Prometheus metrics in
+    apps.utils.metrics, and with QUERY_INSPECTION its SQL is checked by
+    apps.utils.queryinspector. A REQUEST_METRICS_SAMPLE_RATE fraction of
+    requests is also logged as one JSON line on `apps.request_metrics` and,
+    with REQUEST_METRICS_SERVER_TIMING, returned in a Server-Timing header.
+    """
+
+    def start(self):
+        rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        sampled = bool(rate) and random.random() < rate
+        if not sampled and not settings.METRICS_ENABLED and not settings.QUERY_INSPECTION:
+            return None
+
+        instrumentation.install()
+        instrumentation.start(capture_sql=settings.QUERY_INSPECTION)
+        return sampled, time.perf_counter()
+
+    def before(self, request):
+        started = self.start()
+        return started and (*started, instrumentation.hook_queries())
+
+    async def abefore(self, request):
+        # An async view's ORM calls run on a sync thread with connections of
+        # its own, so the query hook goes onto those, from that thread
+        started = self.start()
+        return started and (*started, await sync_to_async(instrumentation.hook_queries)())
+
+    def failed(self, state):
+        if state is not None:
+            state[2].close()
+            instrumentation.finish()
+
+    def after(self, request, response, state):
+        if state is None:
+            return response
+        sampled, start, queries = state
+        queries.close()
+        record = instrumentation.finish()
+        total_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        statements = record.pop('statements', None)
+        if statements is not None:
+            queryinspector.inspect(view_name, request.method, request.path, statements)
+        if settings.METRICS_ENABLED:
+            from apps.utils import metrics
+            metrics.observe_request(view_name, request.method, response.status_code, total_ms / 1000, record)
+        if not sampled:
+            return response
+
+        metrics_logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            **{key: round(value, 1) for key, value in record.items()},
+        }))
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = instrumentation.server_timing(record, total_ms)
+        return response
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class MaintenanceRun(models.Model):
+    job = models.CharField(max_length=100, db_index=True)
+    started_at = models.DateTimeField()
+    duration = models.FloatField(help_text='Seconds')
+    rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.job} at {self.started_at:%Y-%m-%d %H:%M} ({self.rows} rows)"
@@ -0,0 +1,52 @@
+"""
+Development / CI checks on the SQL a request runs (QUERY_INSPECTION).
+
+RequestMetricsMiddleware hands every inspected request's statements to
+inspect(), which logs on `apps.query_inspector`:
+- statements slower than SLOW_QUERY_MS,
+- statement shapes repeated QUERY_REPEAT_THRESHOLD times or more, the usual
+  sign of an N+1 loop (the same SELECT with a different id per row),
+- views that ran more queries than their QUERY_BUDGETS entry.
+With QUERY_BUDGET_STRICT (the default under `manage.py test`) a blown budget
+raises QueryBudgetExceeded instead, so the test requesting that view fails.
+"""
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger('apps.query_inspector')
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def shape(sql):
+    """`sql` with literals and IN-list lengths erased, so per-row repeats compare equal."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+def inspect(view_name, method, path, statements):
+    """Log slow and repeated statements and enforce the view's query budget."""
+    for sql, ms in statements:
+        if ms >= settings.SLOW_QUERY_MS:
+            logger.warning('Slow query (%.1f ms) in %s %s: %s', ms, method, path, sql)
+
+    for sql_shape, count in Counter(shape(sql) for sql, _ in statements).items():
+        if count >= settings.QUERY_REPEAT_THRESHOLD:
+            logger.warning('Possible N+1 in %s %s: %d x %s', method, path, count, sql_shape)
+
+    budget = settings.QUERY_BUDGETS.get(view_name)
+    if budget is not None and len(statements) > budget:
+        message = f'{method} {path} ({view_name}) ran {len(statements)} queries, budget is {budget}'
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message + ':\n' + '\n'.join(sql for sql, _ in statements))
+        logger.warning(message)
@@ -0,0 +1,49 @@
+"""
+Primary/replica database routing.
+
+Reads go to one of settings.DB_REPLICAS, writes always go to the primary.
+Once anything has been written the current request is pinned to the primary,
+and ReplicaPinningMiddleware carries that pin over to the client's next
+requests for DB_REPLICA_STICKY_SECONDS, so a user never reads a stale copy
+of something they just changed (e.g. right after a `profile` update).
+"""
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+
+# Per request, also under ASGI where one thread serves many requests
+_local = Local()
+
+# Apps whose reads must never see replica lag: a session written on login has
+# to be readable on the very next request.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+def start_request(pinned=False):
+    _local.pinned = pinned
+    _local.wrote = False
+
+
+def wrote_during_request():
+    return getattr(_local, 'wrote', False)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not settings.DB_REPLICAS:
+            return None
+        if getattr(_local, 'pinned', False) or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        return random.choice(settings.DB_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            _local.pinned = True
+            _local.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
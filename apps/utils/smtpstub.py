@@ -0,0 +1,106 @@
+"""
+A minimal in-process SMTP server for load tests.
+
+It accepts every message (optionally after a no-op AUTH PLAIN), keeps it in
+memory and lets the caller wait for the next message to a given recipient,
+e.g. to follow a verification link. Point the server under test at it with:
+
+    EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend
+    AWS_SES_REGION_ENDPOINT=127.0.0.1 EMAIL_PORT=<port> EMAIL_USE_TLS=False
+"""
+import email
+import email.policy
+import socketserver
+import threading
+from collections import defaultdict
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 smtpstub ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.reply('250-smtpstub')
+                self.reply('250-AUTH PLAIN')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 smtpstub')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip().strip('<>').lower())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.deliver(recipients, self.read_data())
+                recipients = []
+                self.reply('250 OK: queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # RSET, NOOP and anything else
+                self.reply('250 OK')
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                return b''.join(lines)
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b'..') else line)
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self._inbox = defaultdict(list)
+        self._condition = threading.Condition()
+        self.received = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def deliver(self, recipients, data):
+        message = email.message_from_bytes(data, policy=email.policy.default)
+        with self._condition:
+            self.received += 1
+            for recipient in recipients:
+                self._inbox[recipient].append(message)
+            self._condition.notify_all()
+
+    def wait_for(self, recipient, timeout=10):
+        """Pop the oldest message to `recipient`, waiting up to `timeout` seconds; None if none arrived."""
+        recipient = recipient.lower()
+        with self._condition:
+            if self._condition.wait_for(lambda: self._inbox[recipient], timeout):
+                return self._inbox[recipient].pop(0)
+        return None
+
+
+def message_text(message):
+    part = message.get_body(preferencelist=('plain', 'html'))
+    return part.get_content() if part else ''
@@ -0,0 +1,71 @@
+"""
+Helpers around the configured default storage.
+
+`STORAGES['default']` in core/settings.py is either the local MEDIA_ROOT or an
+S3-compatible bucket (STORAGE_BACKEND=s3). Views go through these helpers so the
+same code works for both: uploads are streamed into storage and downloads are
+served as presigned URLs when the files live in object storage.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponseRedirect
+
+logger = logging.getLogger(__name__)
+
+
+def is_object_storage():
+    return settings.STORAGE_BACKEND == 's3'
+
+
+def save_stream(name, fileobj, storage=default_storage):
+    """
+    Save a file-like object under `name` and return the name actually used.
+    S3 storage uploads it with a chunked multipart transfer instead of
+    buffering the whole body in one request.
+    """
+    fileobj.seek(0)
+    return storage.save(name, File(fileobj, name=os.path.basename(name)))
+
+
+def download_url(name, expire=None, storage=default_storage):
+    """
+    Direct download URL for a stored file. For object storage this is a
+    presigned URL valid for `expire` seconds (AWS_QUERYSTRING_EXPIRE by default).
+    """
+    if is_object_storage():
+        return storage.url(name, expire=expire)
+    return storage.url(name)
+
+
+def serve_file(name, content_type, storage=default_storage):
+    """
+    Response for a stored file: a redirect to the presigned URL for object
+    storage (the bytes never pass through the worker), a streamed read otherwise.
+    """
+    if is_object_storage():
+        return HttpResponseRedirect(download_url(name, storage=storage))
+    return FileResponse(storage.open(name, 'rb'), content_type=content_type)
+
+
+def delete_file(field_file):
+    """Remove the file behind a FieldFile, ignoring storage errors."""
+    if not field_file or not field_file.name:
+        return
+    try:
+        field_file.storage.delete(field_file.name)
+    except Exception:
+        logger.exception("Error deleting file '%s'", field_file.name)
+
+
+def delete_directory(path, storage=default_storage):
+    """Remove every file directly under `path`; a missing directory is not an error."""
+    try:
+        _, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        storage.delete(f'{path}/{filename}')
@@ -0,0 +1,284 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.files.storage import default_storage
+from django.core.mail import get_connection, send_mail
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from apps.authentication.models import CustomUser
+from apps.utils import instrumentation, maintenance
+from apps.utils.middleware import ReplicaPinningMiddleware
+from apps.utils.models import MaintenanceRun
+from apps.utils.queryinspector import QueryBudgetExceeded, inspect, shape
+from apps.utils.storage import delete_directory, delete_file, save_stream
+
+# The session and user lookups every authenticated request starts with
+AUTH_QUERIES = 2
+
+
+class TempMediaRootMixin:
+    """Point MEDIA_ROOT at a fresh temp directory for each test."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class StorageTests(TempMediaRootMixin, TestCase):
+
+    def test_save_stream_rewinds_and_never_overwrites(self):
+        stream = BytesIO(b'first')
+        stream.read()
+        name = save_stream('qrcodes/1/a.png', stream)
+        self.assertEqual(name, 'qrcodes/1/a.png')
+        with default_storage.open(name) as f:
+            self.assertEqual(f.read(), b'first')
+        self.assertNotEqual(save_stream('qrcodes/1/a.png', BytesIO(b'second')), name)
+
+    def test_delete_file_removes_avatar_and_tolerates_missing_files(self):
+        user = CustomUser.objects.create_user('judy', 'judy@example.com', 'judy-password')
+        user.avatar.name = save_stream('avatars/judy.png', BytesIO(b'png'))
+        delete_file(user.avatar)
+        self.assertFalse(default_storage.exists('avatars/judy.png'))
+
+        delete_file(user.avatar)  # already gone: no error
+        delete_file(None)
+
+    def test_delete_directory(self):
+        save_stream('qrcodes/2/a.png', BytesIO(b'a'))
+        save_stream('qrcodes/2/b.png', BytesIO(b'b'))
+        save_stream('qrcodes/3/c.png', BytesIO(b'c'))
+        delete_directory('qrcodes/2')
+        self.assertEqual(default_storage.listdir('qrcodes/2'), ([], []))
+        self.assertTrue(default_storage.exists('qrcodes/3/c.png'))
+
+        delete_directory('qrcodes/404')  # missing: no error
+
+
+@override_settings(DB_REPLICAS=['replica'], DATABASE_ROUTERS=['apps.utils.routers.ReplicaRouter'])
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Adds a `replica` connection, a mirror of the test database, for the
+    duration of the class. It's registered (and added to `databases`) only
+    after the runner's system checks and database setup, which need every
+    alias to be configured. Transactional so both connections see committed rows.
+    """
+
+    databases = {'default'}
+
+    @classmethod
+    def setUpClass(cls):
+        primary = connections['default'].settings_dict
+        connections.settings['replica'] = {**primary, 'TEST': {**primary['TEST'], 'MIRROR': 'default'}}
+        cls.addClassCleanup(cls.remove_replica)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('kate', 'kate@example.com', 'kate-password')
+        self.client.force_login(self.user)
+
+    def request(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, primary.captured_queries, replica.captured_queries
+
+    def test_reads_go_to_the_replica(self):
+        response, primary, replica = self.request('get', reverse('notifications:count'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica)
+        # Only the session, which must never lag, is read from the primary
+        self.assertEqual(len(primary), 1)
+        self.assertIn('django_session', primary[0]['sql'])
+        self.assertNotIn(ReplicaPinningMiddleware.cookie_name, response.cookies)
+
+    def test_write_goes_to_the_primary_and_pins_the_client(self):
+        response, primary, replica = self.request(
+            'patch', reverse('profile_api'), data=json.dumps({'bio': 'Hi'}), content_type='application/json')
+        self.assertEqual(response.json()['updated'], ['bio'])
+        self.assertTrue(any(query['sql'].startswith('UPDATE') for query in primary))
+        self.assertFalse(any(query['sql'].startswith('UPDATE') for query in replica))
+        self.assertIn(ReplicaPinningMiddleware.cookie_name, response.cookies)
+
+        # The pinned client reads its own write from the primary
+        response, primary, replica = self.request('get', reverse('profile_api'))
+        self.assertEqual(response.json()['profile']['bio'], 'Hi')
+        self.assertEqual(replica, [])
+
+
+class StopRunner(Exception):
+    pass
+
+
+class MaintenanceTests(TestCase):
+
+    def run_maintenance(self, *args):
+        call_command('run_maintenance', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_once_runs_every_job_and_records_it(self):
+        self.run_maintenance('--once')
+        self.assertEqual(set(MaintenanceRun.objects.values_list('job', flat=True)),
+                         {name for name, _, _ in maintenance.SCHEDULE})
+
+    def test_job_selection(self):
+        self.run_maintenance('--once', '--job', 'clear_expired_sessions')
+        self.assertEqual(list(MaintenanceRun.objects.values_list('job', flat=True)), ['clear_expired_sessions'])
+        with self.assertRaises(CommandError):
+            self.run_maintenance('--once', '--job', 'nope')
+
+    def test_failing_job_is_recorded(self):
+        def broken(batch_size):
+            raise RuntimeError('boom')
+
+        with mock.patch('apps.utils.management.commands.run_maintenance.SCHEDULE', [('broken', 60, broken)]):
+            self.run_maintenance('--once')
+        run = MaintenanceRun.objects.get()
+        self.assertEqual((run.job, run.rows, run.error), ('broken', 0, 'boom'))
+
+    def test_runner_skips_jobs_that_ran_recently(self):
+        calls = []
+        schedule = [('recent', 3600, lambda batch_size: calls.append('recent') or 0),
+                    ('overdue', 3600, lambda batch_size: calls.append('overdue') or 0)]
+        MaintenanceRun.objects.create(job='recent', started_at=timezone.now(), duration=0)
+        MaintenanceRun.objects.create(job='overdue', started_at=timezone.now() - timedelta(hours=2), duration=0)
+
+        with mock.patch('apps.utils.management.commands.run_maintenance.SCHEDULE', schedule), \
+                mock.patch('apps.utils.management.commands.run_maintenance.time.sleep', side_effect=StopRunner):
+            with self.assertRaises(StopRunner):
+                self.run_maintenance()
+        self.assertEqual(calls, ['overdue'])
+
+    @override_settings(MAINTENANCE_RUN_RETENTION_DAYS=30)
+    def test_prune_maintenance_runs(self):
+        MaintenanceRun.objects.create(job='x', started_at=timezone.now() - timedelta(days=31), duration=0)
+        new = MaintenanceRun.objects.create(job='x', started_at=timezone.now() - timedelta(days=29), duration=0)
+        self.assertEqual(maintenance.prune_maintenance_runs(batch_size=1), 1)
+        self.assertQuerySetEqual(MaintenanceRun.objects.all(), [new])
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SERVER_TIMING=True)
+class RequestMetricsTests(TestCase):
+
+    def test_sampled_request_reports_breakdown(self):
+        user = CustomUser.objects.create_user('dave', 'dave@example.com', 'dave-password')
+        self.client.force_login(user)
+        with self.assertLogs('apps.request_metrics') as logs:
+            response = self.client.get(reverse('email_registration'))
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn(f'desc="{AUTH_QUERIES + 1} queries"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'email_registration')
+        self.assertEqual(record['db_queries'], AUTH_QUERIES + 1)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_query_hook_only_lasts_for_the_request(self):
+        self.client.get(reverse('login'))
+        self.assertEqual(connections['default'].execute_wrappers, [])
+        with self.assertRaises(ValueError), mock.patch('apps.authentication.views.render', side_effect=ValueError):
+            self.client.get(reverse('login'))
+        self.assertEqual(connections['default'].execute_wrappers, [])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        response = self.client.get(reverse('login'))
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsEndpointTests(TestCase):
+
+    def test_internal_scrape_sees_request_latency(self):
+        self.client.get(reverse('login'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'django_request_duration_seconds_count{method="GET",status="200",view="login"}', response.content)
+
+    def test_proxied_public_client_is_refused(self):
+        response = self.client.get(reverse('metrics'), HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_by_default(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    def test_mail_is_timed_once_for_both_the_request_and_prometheus(self):
+        instrumentation.install_mail()
+        instrumentation.install_mail()
+        wrapped = type(get_connection()).send_messages
+        self.assertFalse(hasattr(wrapped.__wrapped__, '__wrapped__'))
+
+        sends = REGISTRY.get_sample_value('email_send_duration_seconds_count') or 0
+        record = instrumentation.start()
+        try:
+            send_mail('Hi', 'Hello', 'from@example.com', ['to@example.com'])
+        finally:
+            instrumentation.finish()
+        self.assertEqual(record['mail_messages'], 1)
+        self.assertEqual(REGISTRY.get_sample_value('email_send_duration_seconds_count'), sends + 1)
+
+
+class QueryInspectorTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('erin', 'erin@example.com', 'erin-password')
+        self.client.force_login(self.user)
+
+    @override_settings(QUERY_INSPECTION=True, QUERY_BUDGET_STRICT=True, QUERY_BUDGETS={'email_registration': 2})
+    def test_view_over_budget_fails(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('email_registration'))
+
+    @override_settings(QUERY_INSPECTION=True, QUERY_BUDGET_STRICT=False, QUERY_BUDGETS={'email_registration': 2})
+    def test_view_over_budget_is_logged_when_not_strict(self):
+        with self.assertLogs('apps.query_inspector', 'WARNING') as logs:
+            response = self.client.get(reverse('email_registration'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('budget is 2', logs.output[0])
+
+    @override_settings(QUERY_INSPECTION=True, QUERY_BUDGET_STRICT=True)
+    def test_admin_changelists_have_budgets(self):
+        admin_user = CustomUser.objects.create_superuser('root', 'root@example.com', 'root-password')
+        self.client.force_login(admin_user)
+        for model in admin.site._registry:
+            if model._meta.app_label not in ('authentication', 'notifications', 'utils'):
+                continue  # third-party admins
+            view_name = f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist'
+            self.assertIn(view_name, settings.QUERY_BUDGETS)
+            self.assertEqual(self.client.get(reverse(view_name)).status_code, 200)
+
+    @override_settings(QUERY_REPEAT_THRESHOLD=3)
+    def test_repeated_statement_shape_is_flagged(self):
+        statements = [(f'SELECT * FROM "notifications_notification" WHERE "id" = {pk}', 0.1) for pk in (1, 2, 3)]
+        with self.assertLogs('apps.query_inspector', 'WARNING') as logs:
+            inspect('notifications:list', 'GET', '/notifications/list/', statements)
+        self.assertIn('Possible N+1', logs.output[0])
+        self.assertEqual(shape('SELECT 1 WHERE "id" IN (%s, %s, %s)'), 'SELECT ? WHERE "id" IN (...)')
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .views import db_stats_view
+
+app_name = 'utils'
+
+urlpatterns = [
+    path('db-stats/', db_stats_view, name='db_stats'),
+]
@@ -0,0 +1,38 @@
+import ipaddress
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse
+
+from apps.utils.db import connection_stats
+
+
+@staff_member_required
+def db_stats_view(request):
+    # Counters are per worker process; the pid tells scrapes of different workers apart.
+    return JsonResponse({'pid': os.getpid(), **connection_stats()})
+
+
+def _from_internal_network(request):
+    """
+    True if the client and every proxy hop it came through are in
+    METRICS_ALLOWED_NETWORKS. A public request relayed by an internal load
+    balancer still carries its public address in X-Forwarded-For.
+    """
+    hops = [request.META.get('REMOTE_ADDR', '')]
+    hops += [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    networks = [ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS]
+    try:
+        addresses = [ipaddress.ip_address(hop) for hop in hops]
+    except ValueError:
+        return False
+    return all(any(address in network for network in networks) for address in addresses)
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED or not _from_internal_network(request):
+        raise Http404
+    from apps.utils.metrics import exposition
+    body, content_type = exposition()
+    return HttpResponse(body, content_type=content_type)
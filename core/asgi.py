@@ -8,5 +8,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Tells the settings not to keep persistent connections (see DB_ASGI)
+os.environ.setdefault('DJANGO_ASGI', 'True')
 
 application = get_asgi_application()
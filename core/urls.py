@@ -8,6 +8,8 @@ from django.urls import path, include  # add this
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.utils.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),          # Django admin route
     path("", include("apps.authentication.urls")), # Auth routes - login / register
@@ -16,6 +18,8 @@ urlpatterns = [
     # ADD NEW Routes HERE
     path('notifications/', include('apps.notifications.urls')),
     path('qrcode/', include('apps.qrcode_generator.urls')),
+    path('utils/', include('apps.utils.urls')),
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape target
 
     # Leave `Home.Urls` as last the last line
     path("", include("apps.home.urls"))
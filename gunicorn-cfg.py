@@ -3,9 +3,79 @@
 Copyright (c) 2019 - present AppSeed.us
 """
 
-bind = '0.0.0.0:5005'
-workers = 1
+import multiprocessing
+import os
+
+# Render and most PaaS tell the app which port to listen on through $PORT
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5005')}")
+
+# Worker model, selected with GUNICORN_WORKER_MODE:
+#   sync    - one request per process (the old behaviour)
+#   gthread - several threads per process, so a slow SMTP call or avatar
+#             resize only ties up one thread instead of a whole worker
+#   uvicorn - ASGI workers serving core.asgi (needs `uvicorn-worker`). Persistent
+#             DB connections are turned off in this mode (DB_CONN_MAX_AGE is
+#             forced to 0), so on PostgreSQL set DB_POOL=True to reuse them.
+worker_mode = os.getenv('GUNICORN_WORKER_MODE', 'gthread')
+
+cpu_count = multiprocessing.cpu_count()
+
+if worker_mode == 'uvicorn':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    wsgi_app = 'core.asgi:application'
+    default_workers = cpu_count
+    default_threads = 1
+elif worker_mode == 'gthread':
+    worker_class = 'gthread'
+    wsgi_app = 'core.wsgi:application'
+    default_workers = cpu_count + 1
+    default_threads = 4
+else:
+    worker_class = 'sync'
+    wsgi_app = 'core.wsgi:application'
+    default_workers = cpu_count * 2 + 1
+    default_threads = 1
+
+# WEB_CONCURRENCY is also what Render and most PaaS set
+workers = int(os.getenv('WEB_CONCURRENCY', min(default_workers, int(os.getenv('GUNICORN_MAX_WORKERS', 12)))))
+threads = int(os.getenv('GUNICORN_THREADS', default_threads))
+
+# Load the app once in the master so workers fork warm, and recycle each worker
+# after a jittered number of requests so slow leaks never pile up and workers
+# don't all restart at the same moment.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
 accesslog = '-'
-loglevel = 'debug'
+loglevel = os.getenv('GUNICORN_LOGLEVEL', 'info')
 capture_output = True
 enable_stdio_inheritance = True
+
+
+def pre_fork(server, worker):
+    # With preload_app the master has already touched the database (see
+    # AuthConfig.ready); don't let forked workers share that socket.
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+# Prometheus multi-process mode (see apps/utils/metrics.py): start from an empty
+# directory and drop the files of workers that exit, e.g. after max_requests.
+def on_starting(server):
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -12,25 +12,6 @@ document.querySelector('#edit-btn').addEventListener('click', (e) => {
     document.querySelector('.quill-container').classList.remove('d-none')
 })
 
-document.querySelector('#edit-bio').addEventListener('click' , (e) => {
-    const csrfToken = document.querySelector('input[name=csrfmiddlewaretoken]').value
-    const data = []
-    document.querySelector('.ql-editor').childNodes.forEach((node) => {
-        data.push(node.outerHTML)
-    })
-    fetch('/profile/', {
-        method: "POST",
-        body:  JSON.stringify({'bio': data.join(''),'action': 'edit_bio',}),
-        headers: {
-            'X-CSRFToken' : csrfToken,
-            'Content-Type': 'application/json'
-        }
-    })
-        .then((response) => response.text())
-        .then((res) => {console.log()})
-        .catch((err) => {console.log(err)})
-} )
-
 // contact-us form
 document.querySelector('#contact-form').addEventListener('submit' , (e) => {
         e.preventDefault()
@@ -39,7 +20,7 @@ document.querySelector('#contact-form').addEventListener('submit' , (e) => {
         button.innerHTML = 'sending...'
         button.disabled = true
 
-        fetch (`/profile/`, {
+        fetch (`/profile/contact/`, {
             method: "POST",
             body: new FormData(e.target),
          })